@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core', 
     'rest_framework',
     'rest_framework_simplejwt',
@@ -84,9 +85,21 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 import os
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', 'https://api.stripe.com')
+
+# Shared httpx client used by the async views (see core/async_views.py)
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get('ASYNC_HTTP_MAX_CONNECTIONS', '100'))
+ASYNC_HTTP_TIMEOUT = float(os.environ.get('ASYNC_HTTP_TIMEOUT', '20'))
 
 GOOGLE_MAPS_EMBED_API_KEY = os.environ.get('GOOGLE_MAPS_EMBED_API_KEY')
 
+# Expo push notifications (delivered by `manage.py send_push_notifications`)
+EXPO_PUSH_URL = os.environ.get('EXPO_PUSH_URL', 'https://exp.host/--/api/v2/push/send')
+EXPO_ACCESS_TOKEN = os.environ.get('EXPO_ACCESS_TOKEN')
+EXPO_PUSH_TIMEOUT = float(os.environ.get('EXPO_PUSH_TIMEOUT', '10'))
+EXPO_PUSH_POOL_SIZE = int(os.environ.get('EXPO_PUSH_POOL_SIZE', '10'))
+EXPO_PUSH_MAX_ATTEMPTS = int(os.environ.get('EXPO_PUSH_MAX_ATTEMPTS', '5'))
+
 
 DATABASES = {
     'default': {
@@ -99,6 +112,49 @@ DATABASES = {
     }
 }
 
+# Connection reuse, selected with DB_POOL_MODE:
+#   persistent - keep one connection per worker thread for DB_CONN_MAX_AGE seconds, health-checked before reuse
+#   pool       - psycopg 3 connection pool (DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE / DB_POOL_TIMEOUT)
+#   none       - open and close a connection for every request
+# ASGI runs sync ORM code on executor threads, where per-thread persistent
+# connections are never reused or closed cleanly, so backend/asgi.py marks the
+# process and it defaults to the pool and never uses persistent connections.
+IS_ASGI = os.environ.get('DJANGO_SERVER_MODE') == 'asgi'
+DB_POOL_MODE = os.environ.get('DB_POOL_MODE', 'pool' if IS_ASGI else 'persistent')
+
+if DB_POOL_MODE == 'pool':
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # required by Django when pooling
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        },
+    }
+elif DB_POOL_MODE == 'persistent' and not IS_ASGI:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+
+# Cache: shared Redis when REDIS_URL is set (docker-compose sets it for every service). Catalog invalidation
+# and support markers are written by workers too, so per-process LocMemCache only suits a single process.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', '300'))
 
 
 # Password validation
@@ -149,6 +205,10 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Cursor pagination for list endpoints (opt-in with ?page_size= or ?cursor=)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '200'))
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = []
 STATIC_ROOT = BASE_DIR / "staticfiles"
@@ -163,6 +223,12 @@ JAZZMIN_SETTINGS = {
     "show_sidebar": True,
     "navigation_expanded": True,
     "hide_apps": [],  # apps you want hidden (optional)
+    "custom_links": {
+        "core": [
+            {"name": "Support Inbox", "url": "admin:support-inbox", "icon": "fas fa-inbox"},
+            {"name": "Analytics", "url": "admin:analytics-dashboard", "icon": "fas fa-chart-bar"},
+        ],
+    },
     "show_ui_builder": True,  # lets you live tweak styles from the admin
     "default_theme": "dark",  # 👈 Set dark mode by default
 }
@@ -201,4 +267,23 @@ JAZZMIN_UI_TWEAKS = {
 import os
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Media delivery (core/media.py). Set MEDIA_SENDFILE_BACKEND to "nginx" (X-Accel-Redirect)
+# or "sendfile" (Apache/lighttpd X-Sendfile) to let the front server send the bytes.
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 60 * 60 * 24 * 30))
+# Files under these prefixes are only served to their owner and staff.
+PRIVATE_MEDIA_PREFIXES = ['certifications/']
+
+# Resumable certification uploads (core/uploads.py)
+CERTIFICATION_MAX_UPLOAD_SIZE = int(os.environ.get('CERTIFICATION_MAX_UPLOAD_SIZE', 50 * 1024 * 1024))
+CERTIFICATION_UPLOAD_CHUNK_SIZE = int(os.environ.get('CERTIFICATION_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+
+# Bookable hours (in TIME_ZONE) and slot granularity for /api/services/<id>/availability/
+BOOKING_OPEN_HOUR = int(os.environ.get('BOOKING_OPEN_HOUR', '9'))
+BOOKING_CLOSE_HOUR = int(os.environ.get('BOOKING_CLOSE_HOUR', '18'))
+BOOKING_SLOT_MINUTES = int(os.environ.get('BOOKING_SLOT_MINUTES', '30'))
+
+# Rows fetched per database round trip by the streaming admin exports (core/exports.py)
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from django.db.models import Avg
+from django.db import connection
+from django.db.models import Avg, Count, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Trim
+from django.core.paginator import Paginator
 from django.conf import settings
 from .models import (
     Service, 
@@ -10,31 +13,137 @@ from .models import (
     Transaction, 
     ProductCategory,
     ProductReview,
-    SupportMessage)
+    SupportMessage,
+    PushNotification,
+    PushCampaign,
+    PushTicket,
+    StripeEvent,
+    CertificationUpload,
+    ProfileFacet,
+    DailyServiceStats,
+    DailyPaymentStats,
+    RollupCheckpoint)
+from .images import thumbnail_url
+from .exports import StreamingExportAdminMixin
+from .pagination import EstimatedCountPaginator
+from .rollups import CHECKPOINT, dashboard_data
+from .search import FullTextSearchAdminMixin
 from django.utils.html import format_html
+from django.utils.text import smart_split, unescape_string_literal
 from django.urls import reverse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
+from django.utils import timezone
+from datetime import timedelta
 User = get_user_model()
 from django.contrib import admin
 from django.urls import re_path
 
 @admin.register(Service)
-class ServiceAdmin(admin.ModelAdmin):
+class ServiceAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'price', 'duration_minutes', 'created_at')
     search_fields = ('name', 'description')
     list_filter = ('created_at',)
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(StreamingExportAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'service', 'appointment_time', 'status', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('user__username', 'service__name')
     ordering = ('-created_at',)
+    list_select_related = ('user', 'service')
+    export_columns = (
+        ('id', 'id'),
+        ('user', 'user__username'),
+        ('email', 'user__email'),
+        ('service', 'service__name'),
+        ('price', 'service__price'),
+        ('appointment_time', 'appointment_time'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+    )
     
     
+def with_average_rating(queryset):
+    # A correlated subquery is only evaluated for the rows on the page,
+    # instead of aggregating every profile's orders before paginating.
+    ratings = (
+        Feedback.objects.filter(order__user_id=OuterRef('user_id'))
+        .order_by()
+        .values('order__user_id')
+        .annotate(avg=Avg('rating'))
+        .values('avg')
+    )
+    return queryset.annotate(avg_rating=Subquery(ratings, output_field=FloatField()))
+
+
+class ProfileFacetFilter(admin.SimpleListFilter):
+    """City/country choices from the ProfileFacet counts instead of SELECT DISTINCT over Profile."""
+    facet_field = None
+    max_choices = 100
+
+    def lookups(self, request, model_admin):
+        facets = (
+            ProfileFacet.objects.filter(field=self.facet_field, count__gt=0)
+            .order_by('-count', 'value')
+            .values_list('value', 'count')[:self.max_choices]
+        )
+        return [(value, f'{value} ({count:,})') for value, count in facets]
+
+    def queryset(self, request, queryset):
+        # Facets count trimmed values, so match on the trimmed column too (profile_*_trim_idx).
+        if self.value():
+            return queryset.annotate(facet_value=Trim(self.facet_field)).filter(facet_value=self.value())
+        return queryset
+
+
+class CityFacetFilter(ProfileFacetFilter):
+    title = 'city'
+    parameter_name = 'city'
+    facet_field = 'city'
+
+
+class CountryFacetFilter(ProfileFacetFilter):
+    title = 'country'
+    parameter_name = 'country'
+    facet_field = 'country'
+
+
+class RatingBandFilter(admin.SimpleListFilter):
+    title = 'average rating'
+    parameter_name = 'rating_band'
+
+    BANDS = {
+        '4-5': (4, None),
+        '3-4': (3, 4),
+        '2-3': (2, 3),
+        '1-2': (None, 2),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('4-5', '4★ and above'),
+            ('3-4', '3★ to 4★'),
+            ('2-3', '2★ to 3★'),
+            ('1-2', 'Below 2★'),
+            ('none', 'No ratings'),
+        )
+
+    def queryset(self, request, queryset):
+        # Relies on the avg_rating annotation added by ProfileAdmin.get_queryset.
+        if self.value() == 'none':
+            return queryset.filter(avg_rating__isnull=True)
+        if self.value() in self.BANDS:
+            low, high = self.BANDS[self.value()]
+            if low is not None:
+                queryset = queryset.filter(avg_rating__gte=low)
+            if high is not None:
+                queryset = queryset.filter(avg_rating__lt=high)
+        return queryset
+
+
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = (
@@ -63,31 +172,49 @@ class ProfileAdmin(admin.ModelAdmin):
     )
     list_filter = (
         'gender',
-        'city',
-        'country',
+        CityFacetFilter,
+        CountryFacetFilter,
         'is_service_provider',
         'is_approved_provider',
+        RatingBandFilter,
         'created_at'
     )
 
 
     actions = ['delete_low_rated_profiles']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return with_average_rating(super().get_queryset(request)).select_related('user')
+
+    def get_search_results(self, request, queryset, search_term):
+        # One UNION per word, so every branch can use its own trigram index
+        # (an OR across the profile and user tables cannot).
+        profile_fields = [field for field in self.search_fields if not field.startswith('user__')]
+        for bit in smart_split(search_term):
+            bit = unescape_string_literal(bit) if bit[0] in ('"', "'") and bit[-1] == bit[0] else bit
+            in_profile = Q()
+            for field in profile_fields:
+                in_profile |= Q(**{f'{field}__icontains': bit})
+            matches = Profile.objects.filter(in_profile).values('pk').union(
+                Profile.objects.filter(user__username__icontains=bit).values('pk')
+            )
+            queryset = queryset.filter(pk__in=matches)
+        return queryset, False
 
     def average_rating(self, obj):
-        feedbacks = Feedback.objects.filter(order__user=obj.user)
-        avg = feedbacks.aggregate(Avg('rating'))['rating__avg']
+        avg = obj.avg_rating
         return round(avg, 2) if avg else "-"
     
     average_rating.short_description = "Avg Rating"
+    average_rating.admin_order_field = 'avg_rating'
 
     def delete_low_rated_profiles(self, request, queryset):
-        deleted = 0
-        for profile in queryset:
-            avg = Feedback.objects.filter(order__user=profile.user).aggregate(Avg('rating'))['rating__avg']
-            if avg and avg < 3:
-                profile.user.delete()
-                deleted += 1
-        self.message_user(request, f"Deleted {deleted} users with low ratings.")
+        # The action receives the annotated changelist queryset.
+        low_rated_users = list(queryset.filter(avg_rating__lt=3).values_list('user_id', flat=True))
+        User.objects.filter(pk__in=low_rated_users).delete()
+        self.message_user(request, f"Deleted {len(low_rated_users)} users with low ratings.")
     
     delete_low_rated_profiles.short_description = "Delete users with average rating below 3"
 
@@ -123,7 +250,7 @@ class ProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'price', 'created_at', 'product_image_preview')  
     search_fields = ('name', 'description')
     list_filter = ('created_at',)
@@ -133,22 +260,48 @@ class ProductAdmin(admin.ModelAdmin):
 
     def product_image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="100" height="100" style="object-fit: cover;" />', obj.image.url)
+            return format_html(
+                '<img src="{}" width="100" height="100" loading="lazy" style="object-fit: cover;" />',
+                thumbnail_url(obj.image, obj.image_variants),
+            )
         return "-"
     
     product_image_preview.short_description = "Image Preview"
 
 @admin.register(Feedback)
-class FeedbackAdmin(admin.ModelAdmin):
+class FeedbackAdmin(StreamingExportAdminMixin, admin.ModelAdmin):
     list_display = ('order', 'rating', 'comment', 'created_at')
     search_fields = ('order__user__username', 'order__service__name', 'comment')
     list_filter = ('rating', 'created_at')
+    list_select_related = ('order__user', 'order__service')
+    export_columns = (
+        ('id', 'id'),
+        ('order', 'order_id'),
+        ('user', 'order__user__username'),
+        ('service', 'order__service__name'),
+        ('appointment_time', 'order__appointment_time'),
+        ('rating', 'rating'),
+        ('comment', 'comment'),
+        ('created_at', 'created_at'),
+    )
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(StreamingExportAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'payment_method', 'status', 'reference', 'created_at')
     search_fields = ('user__username', 'reference')
     list_filter = ('payment_method', 'status', 'created_at')
+    list_select_related = ('user',)
+    export_columns = (
+        ('id', 'id'),
+        ('user', 'user__username'),
+        ('email', 'user__email'),
+        ('amount', 'amount'),
+        ('payment_method', 'payment_method'),
+        ('status', 'status'),
+        ('reference', 'reference'),
+        ('description', 'description'),
+        ('created_at', 'created_at'),
+    )
 
 
 class ProductInline(admin.TabularInline):
@@ -171,15 +324,17 @@ class ProductReviewAdmin(admin.ModelAdmin):
     list_display = ['product', 'user', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
     search_fields = ['user__username', 'product__name', 'comment'] 
+    list_select_related = ['product', 'user']
 
 @admin.register(SupportMessage)
 class SupportMessageAdmin(admin.ModelAdmin):
     list_display = ['linked_user', 'preview', 'is_from_admin', 'created_at']
     list_filter = ['is_from_admin', 'created_at']
     search_fields = ['user__username', 'message']
+    list_select_related = ['user']
 
     def linked_user(self, obj):
-        url = f"/admin/support/thread/{obj.user.id}/"
+        url = f"/admin/support/thread/{obj.user_id}/"
         return format_html('<a href="{}" target="_blank">{}</a>', url, obj.user.username)
 
     linked_user.short_description = "User"
@@ -188,6 +343,67 @@ class SupportMessageAdmin(admin.ModelAdmin):
         return (obj.message[:50] + '...') if len(obj.message) > 50 else obj.message
  
 
+@admin.register(PushNotification)
+class PushNotificationAdmin(admin.ModelAdmin):
+    list_display = ('title', 'token', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('token', 'title', 'ticket_id')
+    readonly_fields = ('ticket_id', 'last_error', 'sent_at', 'created_at')
+
+
+@admin.register(PushCampaign)
+class PushCampaignAdmin(admin.ModelAdmin):
+    list_display = ('title', 'status', 'sent_count', 'failed_count', 'pruned_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('title', 'message')
+    readonly_fields = ('sent_count', 'failed_count', 'pruned_count', 'started_at', 'finished_at', 'created_at')
+
+    actions = ['queue_campaigns']
+
+    def queue_campaigns(self, request, queryset):
+        queued = queryset.filter(status='draft').update(status='queued')
+        self.message_user(request, f"Queued {queued} campaigns. They will be sent by the send_push_campaigns worker.")
+
+    queue_campaigns.short_description = "Queue selected campaigns for broadcast"
+
+
+@admin.register(PushTicket)
+class PushTicketAdmin(admin.ModelAdmin):
+    list_display = ('campaign', 'token', 'status', 'error', 'created_at')
+    list_filter = ('status', 'error')
+    search_fields = ('token', 'ticket_id')
+    list_select_related = ('campaign',)
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'received_at', 'processed_at')
+    list_filter = ('type', 'received_at')
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'type', 'payload', 'received_at', 'processed_at')
+
+
+@admin.register(CertificationUpload)
+class CertificationUploadAdmin(admin.ModelAdmin):
+    list_display = ('user', 'filename', 'field', 'offset', 'size', 'status', 'updated_at')
+    list_filter = ('status', 'field')
+    search_fields = ('user__username', 'filename')
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'field', 'filename', 'size', 'sha256', 'offset', 'status', 'stored_name', 'error')
+
+
+@admin.register(ProfileFacet)
+class ProfileFacetAdmin(admin.ModelAdmin):
+    list_display = ('field', 'value', 'count')
+    list_filter = ('field',)
+    search_fields = ('value',)
+    readonly_fields = ('field', 'value', 'count')
+
+
+SUPPORT_INBOX_PAGE_SIZE = 50
+SUPPORT_THREAD_PAGE_SIZE = 50
+
+
 @staff_member_required
 def support_thread_view(request, user_id):
     user = get_object_or_404(User, id=user_id)
@@ -207,11 +423,24 @@ def support_thread_view(request, user_id):
                 )
                 return redirect(request.path)
 
-    messages = SupportMessage.objects.filter(user=user).order_by('created_at')
+    # Newest page first; "Load older messages" walks back with ?before=<message id>.
+    messages = SupportMessage.objects.filter(user=user).order_by('-created_at', '-id')
+    try:
+        before = int(request.GET.get('before', ''))
+    except ValueError:
+        before = None
+    if before is not None:
+        anchor = SupportMessage.objects.filter(user=user, pk=before).values_list('created_at', flat=True).first()
+        if anchor is not None:
+            messages = messages.filter(created_at__lte=anchor).exclude(created_at=anchor, id__gte=before)
+    page = list(messages[:SUPPORT_THREAD_PAGE_SIZE + 1])
+    has_older = len(page) > SUPPORT_THREAD_PAGE_SIZE
+    page = page[:SUPPORT_THREAD_PAGE_SIZE][::-1]
 
     context = {
         'user': user,
-        'messages': messages,
+        'messages': page,
+        'older_before': page[0].id if has_older else None,
         'title': f'Support Thread with {user.username}',
         'resolved': user.profile.support_resolved
     }
@@ -219,12 +448,110 @@ def support_thread_view(request, user_id):
     return TemplateResponse(request, 'admin/support_thread.html', context)
 
 
+def support_inbox_queryset():
+    """One row per user: their latest message, unread count and resolved flag.
+
+    Latest messages come from a single DISTINCT ON scan of the (user, created_at, id)
+    index; the unread count (user messages since the last admin reply) is a
+    correlated subquery, evaluated only for the rows on the requested page.
+    """
+    if connection.vendor == 'postgresql':
+        latest_ids = SupportMessage.objects.order_by('user_id', '-created_at', '-id').distinct('user_id').values('id')
+    else:
+        # Same "latest" as DISTINCT ON: newest created_at, then highest id, per user.
+        newest = SupportMessage.objects.filter(user=OuterRef('user')).order_by('-created_at', '-id').values('id')[:1]
+        latest_ids = SupportMessage.objects.filter(id=Subquery(newest)).values('id')
+
+    last_admin_reply = (
+        SupportMessage.objects
+        .filter(user=OuterRef('user'), is_from_admin=True)
+        .order_by('-id')
+        .values('id')[:1]
+    )
+    unread = (
+        SupportMessage.objects
+        .filter(user=OuterRef('user'), is_from_admin=False, id__gt=Coalesce(Subquery(last_admin_reply), Value(0)))
+        .order_by()
+        .values('user')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return (
+        SupportMessage.objects
+        .filter(id__in=latest_ids)
+        .select_related('user__profile')
+        .annotate(unread_count=Coalesce(Subquery(unread), Value(0)))
+        .order_by('-created_at', '-id')
+    )
+
+
+@staff_member_required
+def support_inbox_view(request):
+    conversations = support_inbox_queryset()
+    status = request.GET.get('status')
+    if status == 'open':
+        conversations = conversations.filter(user__profile__support_resolved=False)
+    elif status == 'resolved':
+        conversations = conversations.filter(user__profile__support_resolved=True)
+
+    page = Paginator(conversations, SUPPORT_INBOX_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    context = {
+        **admin.site.each_context(request),
+        'page': page,
+        'status': status,
+        'title': 'Support Inbox',
+    }
+
+    return TemplateResponse(request, 'admin/support_inbox.html', context)
+
+
+ANALYTICS_RANGES = {'30': 30, '90': 90, '365': 365, 'all': None}
+ANALYTICS_DAILY_MAX_DAYS = 92
+
+
+@staff_member_required
+def analytics_dashboard_view(request):
+    """Bookings, revenue and ratings over time, read from the rollup tables only (see core/rollups.py)."""
+    selected = request.GET.get('range', '90')
+    if selected not in ANALYTICS_RANGES:
+        selected = '90'
+    last = timezone.localdate()
+    days = ANALYTICS_RANGES[selected]
+    if days:
+        first = last - timedelta(days=days - 1)
+    else:
+        first = min(
+            filter(None, [
+                DailyServiceStats.objects.order_by('day').values_list('day', flat=True).first(),
+                DailyPaymentStats.objects.order_by('day').values_list('day', flat=True).first(),
+            ]),
+            default=last,
+        )
+    by_month = (last - first).days + 1 > ANALYTICS_DAILY_MAX_DAYS
+
+    context = {
+        **admin.site.each_context(request),
+        **dashboard_data(first, last, by_month),
+        'ranges': [(key, 'All time' if key == 'all' else f'Last {key} days') for key in ANALYTICS_RANGES],
+        'selected': selected,
+        'first': first,
+        'last': last,
+        'by_month': by_month,
+        'refreshed_at': RollupCheckpoint.objects.filter(name=CHECKPOINT).values_list('processed_until', flat=True).first(),
+        'title': 'Analytics',
+    }
+
+    return TemplateResponse(request, 'admin/analytics_dashboard.html', context)
+
 
 original_get_urls = admin.site.get_urls
 
 def get_urls():
     custom_urls = [
+        re_path(r'^support/inbox/$', support_inbox_view, name='support-inbox'),
         re_path(r'^support/thread/(?P<user_id>\d+)/$', support_thread_view, name='support-thread'),
+        re_path(r'^analytics/$', analytics_dashboard_view, name='analytics-dashboard'),
     ]
     return custom_urls + original_get_urls()
 
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .search import create_extensions, install_admin_search_indexes, install_search_triggers
+
+        pre_migrate.connect(create_extensions, sender=self)
+        post_migrate.connect(install_search_triggers, sender=self)
+        post_migrate.connect(install_admin_search_indexes, sender=self)
@@ -0,0 +1,135 @@
+"""Async variants of views that spend most of their time waiting on external APIs.
+
+Under ASGI (``backend/asgi.py``) a request parked on Stripe no longer holds a
+worker thread, so slow upstream calls cannot starve the cheap endpoints.
+ORM calls go through Django's async ORM API, which runs them in the
+thread-sensitive sync executor.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .cache import get_support_marker
+from .models import SupportMessage, Transaction
+from .serializers import SupportMessageSerializer
+from .utils import create_stripe_payment_intent
+
+
+async def authenticate(request):
+    """Resolve the JWT bearer token on a plain Django request, or return None."""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+    return request.POST
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCreatePaymentIntentView(View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        user = await authenticate(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+        data = request_data(request)
+        amount = data.get("amount")
+        currency = "usd"
+        description = data.get("description", "")
+
+        if not amount:
+            return JsonResponse({"error": "Amount is required."}, status=400)
+
+        try:
+            intent = await create_stripe_payment_intent(
+                amount=int(amount),
+                currency=currency,
+                description=description,
+                metadata={"user_id": user.id},
+            )
+
+            await Transaction.objects.acreate(
+                user=user,
+                amount=float(amount) / 100,  # convert cents to dollars
+                payment_method='stripe',
+                status='pending',
+                reference=intent['id'],
+                description=description,
+            )
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+
+        return JsonResponse({
+            "client_secret": intent['client_secret'],
+            "payment_intent_id": intent['id'],
+        }, status=201)
+
+
+# Support message stream (server-sent events)
+STREAM_TIMEOUT = 55  # seconds; clients reconnect with Last-Event-ID
+STREAM_POLL_INTERVAL = 1
+STREAM_DB_CHECK_EVERY = 10  # ticks between unconditional DB checks
+STREAM_KEEPALIVE_EVERY = 15  # ticks between comment lines that keep proxies from timing out
+
+
+class SupportMessageStreamView(View):
+    """Push new support messages for the authenticated user as server-sent events.
+
+    Each tick reads the user's "latest message id" marker from the cache and
+    only queries the database when it is ahead of the client's cursor. The
+    database is still checked every ``STREAM_DB_CHECK_EVERY`` ticks in case
+    the marker was written to another process's local cache.
+    """
+    http_method_names = ['get']
+
+    async def get(self, request):
+        user = await authenticate(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+        cursor = request.headers.get('Last-Event-ID') or request.GET.get('since_id')
+        if cursor is not None and not (cursor.isascii() and cursor.isdigit()):
+            return JsonResponse({"since_id": "Must be a message id."}, status=400)
+        if cursor is None:
+            # Start from "now": the history is available from /api/support/messages/.
+            latest = await SupportMessage.objects.filter(user=user).order_by('-id').values_list('id', flat=True).afirst()
+            cursor = latest or 0
+
+        response = StreamingHttpResponse(self.events(user, int(cursor)), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, user, cursor):
+        yield 'retry: 3000\n\n'
+        ticks = int(STREAM_TIMEOUT / STREAM_POLL_INTERVAL)
+        for tick in range(ticks):
+            marker = await get_support_marker(user.id)
+            if (marker is not None and marker > cursor) or tick % STREAM_DB_CHECK_EVERY == 0:
+                messages = SupportMessage.objects.filter(user=user, id__gt=cursor).order_by('id')
+                async for message in messages:
+                    message.user = user
+                    cursor = message.id
+                    data = json.dumps(SupportMessageSerializer(message).data, cls=JSONEncoder, separators=(',', ':'))
+                    yield f'id: {message.id}\nevent: message\ndata: {data}\n\n'
+            if tick and tick % STREAM_KEEPALIVE_EVERY == 0:
+                yield ': keepalive\n\n'
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
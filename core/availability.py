@@ -0,0 +1,76 @@
+"""Free booking slots for a service.
+
+Busy time is read with one range query over the ``order_service_slot_idx``
+index (non-cancelled orders by service and appointment time), merged into
+disjoint intervals, and swept against the candidate slots of each day.
+Orders have no duration of their own, so every booking of a service
+occupies ``Service.duration_minutes``.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Order
+
+MAX_RANGE_DAYS = 31
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching ``(start, end)`` pairs into a sorted, disjoint list."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def overlapping_orders(service, start, end):
+    """Non-cancelled bookings of ``service`` that overlap ``[start, end)``."""
+    duration = timedelta(minutes=service.duration_minutes)
+    # A booking that starts up to one duration before the window still overlaps it.
+    return (
+        Order.objects
+        .filter(service=service, appointment_time__gt=start - duration, appointment_time__lt=end)
+        .exclude(status='cancelled')
+    )
+
+
+def busy_intervals(service, start, end):
+    """Intervals occupied by bookings that overlap ``[start, end)``."""
+    duration = timedelta(minutes=service.duration_minutes)
+    times = overlapping_orders(service, start, end).values_list('appointment_time', flat=True)
+    return merge_intervals((t, t + duration) for t in times)
+
+
+def free_slots(service, first_day, last_day, now=None):
+    """Return ``{date: [slot start, ...]}`` for every day from ``first_day`` to ``last_day``."""
+    tz = timezone.get_current_timezone()
+    now = now or timezone.now()
+    duration = timedelta(minutes=service.duration_minutes)
+    step = timedelta(minutes=settings.BOOKING_SLOT_MINUTES)
+
+    window_start = timezone.make_aware(datetime.combine(first_day, time(settings.BOOKING_OPEN_HOUR)), tz)
+    window_end = timezone.make_aware(datetime.combine(last_day, time(settings.BOOKING_CLOSE_HOUR)), tz)
+    busy = busy_intervals(service, window_start, window_end)
+
+    days = {}
+    index = 0
+    day = first_day
+    while day <= last_day:
+        slot = timezone.make_aware(datetime.combine(day, time(settings.BOOKING_OPEN_HOUR)), tz)
+        close = timezone.make_aware(datetime.combine(day, time(settings.BOOKING_CLOSE_HOUR)), tz)
+        slots = []
+        while slot + duration <= close:
+            # Busy intervals and slots are both sorted, so skip intervals that already ended.
+            while index < len(busy) and busy[index][1] <= slot:
+                index += 1
+            if slot >= now and not (index < len(busy) and busy[index][0] < slot + duration):
+                slots.append(slot)
+            slot += step
+        days[day] = slots
+        day += timedelta(days=1)
+    return days
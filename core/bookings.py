@@ -0,0 +1,52 @@
+"""Booking write path.
+
+A booking is checked and inserted in one transaction while holding a lock
+scoped to its service and the day(s) it occupies. Only bookings that could
+overlap wait for each other: other services, and other days of the same
+service, proceed in parallel. On PostgreSQL the lock is a transaction-level
+advisory lock. Other backends lock the service row instead, which is coarser
+but still correct.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .availability import overlapping_orders
+from .models import Service
+
+
+def booking_days(start, end):
+    """Local dates touched by ``[start, end)``, in ascending order."""
+    first = timezone.localdate(start)
+    last = timezone.localdate(end - timedelta(microseconds=1))
+    return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+def lock_booking_window(service, start, end):
+    """Block concurrent bookings of ``service`` that touch the same day(s) until commit.
+
+    Any two overlapping bookings share at least one day, and days are always
+    locked in ascending order, so a booking that crosses midnight cannot deadlock
+    with its neighbours.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for day in booking_days(start, end):
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [service.pk, day.toordinal()])
+    else:
+        list(Service.objects.select_for_update().filter(pk=service.pk).values_list('pk'))
+
+
+def create_booking(serializer, user):
+    """Save the validated ``OrderSerializer`` unless the slot overlaps an existing booking."""
+    service = serializer.validated_data['service']
+    start = serializer.validated_data['appointment_time']
+    end = start + timedelta(minutes=service.duration_minutes)
+
+    with transaction.atomic():
+        lock_booking_window(service, start, end)
+        if overlapping_orders(service, start, end).exists():
+            raise serializers.ValidationError({'appointment_time': ['This time slot is no longer available.']})
+        return serializer.save(user=user)
@@ -0,0 +1,71 @@
+"""Distance search over ``Profile.latitude``/``longitude`` without PostGIS.
+
+A bounding box around the origin is matched against the partial
+``provider_location_idx`` B-tree (covering, so only the index is read),
+then exact haversine distances are computed in Python for the rows
+inside the box.
+"""
+import heapq
+import math
+
+from django.db.models import Q
+
+from .models import Profile
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_RADIUS_KM = 200
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """Return ``(min_lat, max_lat, lng_ranges)``; longitude is split in two at the antimeridian."""
+    d_lat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle contains a pole: every longitude is in range.
+        return max(min_lat, -90), min(max_lat, 90), [(-180, 180)]
+
+    # Widest longitude span of the circle (at the latitude of its tangent points).
+    d_lng = math.degrees(math.asin(math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))))
+    min_lng, max_lng = lng - d_lng, lng + d_lng
+    if min_lng < -180:
+        return min_lat, max_lat, [(min_lng + 360, 180), (-180, max_lng)]
+    if max_lng > 180:
+        return min_lat, max_lat, [(min_lng, 180), (-180, max_lng - 360)]
+    return min_lat, max_lat, [(min_lng, max_lng)]
+
+
+def nearby_providers(lat, lng, radius_km, limit):
+    """Approved providers within ``radius_km`` of the origin, nearest first."""
+    min_lat, max_lat, lng_ranges = bounding_box(lat, lng, radius_km)
+    in_lng = Q()
+    for low, high in lng_ranges:
+        in_lng |= Q(longitude__range=(low, high))
+
+    candidates = (
+        Profile.objects
+        .filter(is_service_provider=True, is_approved_provider=True, latitude__range=(min_lat, max_lat))
+        .filter(in_lng)
+        .values_list('user_id', 'latitude', 'longitude')
+    )
+    # Only coordinates are read for the whole box; details are fetched for the winners.
+    nearest = heapq.nsmallest(limit, (
+        (distance, user_id)
+        for user_id, row_lat, row_lng in candidates
+        for distance in (haversine_km(lat, lng, row_lat, row_lng),)
+        if distance <= radius_km
+    ))
+    details = {
+        row['user_id']: row
+        for row in Profile.objects.filter(user_id__in=[user_id for _, user_id in nearest])
+        .values('user_id', 'user__username', 'city', 'country', 'latitude', 'longitude')
+    }
+    return [dict(details[user_id], distance_km=distance) for distance, user_id in nearest]
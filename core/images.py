@@ -0,0 +1,152 @@
+"""Resized WebP/JPEG variants for uploaded images.
+
+Uploads only store the original. Saving a new image clears the model's
+variants field (see the receivers in ``models.py``) and the worker,
+``manage.py build_image_variants``, renders the sizes in :data:`VARIANT_SIZES`
+with :func:`process_pending_images`. Serializers expose them with
+:func:`variant_map`.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .cache import PRODUCTS, bump_catalog_version
+from .models import Product, Profile
+
+# Longest edge in pixels. "thumb" covers the 100x100 admin preview on HiDPI screens.
+VARIANT_SIZES = {
+    'thumb': 200,
+    'small': 480,
+    'medium': 960,
+    'large': 1600,
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# (model, image field, variants field, catalog cache namespace)
+IMAGE_FIELDS = [
+    (Product, 'image', 'image_variants', PRODUCTS),
+    (Profile, 'profile_picture', 'picture_variants', None),
+]
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        if image.mode != 'RGB':
+            # JPEG has no alpha channel; flatten onto white like browsers do.
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(field_file):
+    """Render every size that is smaller than the original (and always the thumb)."""
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as f:
+        original = Image.open(f)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+    variants = {'source': field_file.name, 'sizes': {}}
+    for size, edge in VARIANT_SIZES.items():
+        if edge >= max(original.size) and size != 'thumb':
+            continue
+        image = original.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        entry = {'width': image.width, 'height': image.height}
+        for fmt in ('webp', 'jpeg'):
+            name = os.path.join(directory, 'variants', f'{stem}-{size}.{fmt}')
+            entry[fmt] = storage.save(name, _encode(image, fmt))
+        variants['sizes'][size] = entry
+    return variants
+
+
+def delete_variant_files(storage, variants):
+    for entry in (variants or {}).get('sizes', {}).values():
+        for fmt in ('webp', 'jpeg'):
+            if entry.get(fmt):
+                storage.delete(entry[fmt])
+
+
+def variant_map(field_file, variants, request=None):
+    """Public URLs of the original and every rendered size, for API responses."""
+    if not field_file:
+        return None
+
+    def url(name):
+        value = field_file.storage.url(name)
+        return request.build_absolute_uri(value) if request is not None else value
+
+    sizes = {'original': url(field_file.name)}
+    if variants and variants.get('source') == field_file.name:
+        for size, entry in variants.get('sizes', {}).items():
+            sizes[size] = {
+                'width': entry['width'],
+                'height': entry['height'],
+                'webp': url(entry['webp']),
+                'jpeg': url(entry['jpeg']),
+            }
+    return sizes
+
+
+def thumbnail_url(field_file, variants):
+    """Smallest available rendition, falling back to the original."""
+    thumb = (variants or {}).get('sizes', {}).get('thumb')
+    if thumb and variants.get('source') == field_file.name:
+        return field_file.storage.url(thumb['webp'])
+    return field_file.url
+
+
+def process_pending_images(batch_size=20, rebuild=False, after_pk=None):
+    """Render variants for one batch of rows per image field.
+
+    Returns ``(processed, last_pk)`` where ``last_pk`` maps each model to the
+    highest primary key seen, so ``rebuild`` runs can page through every row.
+    """
+    processed = 0
+    last_pk = {}
+    for model, field, variants_field, namespace in IMAGE_FIELDS:
+        rows = model.objects.exclude(Q(**{field: ''}) | Q(**{f'{field}__isnull': True}))
+        if rebuild:
+            rows = rows.filter(pk__gt=(after_pk or {}).get(model, 0))
+        else:
+            rows = rows.filter(**{f'{variants_field}__isnull': True})
+        rows = list(rows.order_by('pk').only('pk', field, variants_field)[:batch_size])
+
+        changed = False
+        for row in rows:
+            field_file = getattr(row, field)
+            old = getattr(row, variants_field)
+            try:
+                variants = build_variants(field_file)
+            except (OSError, Image.DecompressionBombError) as exc:
+                # Unreadable or missing originals are recorded so they are not retried forever.
+                variants = {'source': field_file.name, 'sizes': {}, 'error': str(exc)[:200]}
+
+            # Only store the result if the image was not replaced while we were rendering.
+            updated = model.objects.filter(pk=row.pk, **{field: field_file.name}).update(**{variants_field: variants})
+            if updated:
+                changed = True
+                if old and old.get('sizes') != variants['sizes']:
+                    delete_variant_files(field_file.storage, old)
+            else:
+                delete_variant_files(field_file.storage, variants)
+            processed += 1
+
+        if rows:
+            last_pk[model] = rows[-1].pk
+        if changed and namespace:
+            bump_catalog_version(namespace)
+    return processed, last_pk
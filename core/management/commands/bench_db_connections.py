@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+BENCH_PATH = '/api/my-bookings/'
+MODES = ('none', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/sec of a cheap authenticated endpoint for each DB_POOL_MODE. "
+        "Each mode runs in its own process so it gets the settings it would get in production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=4,
+                            help="Concurrent request threads, like a threaded WSGI worker.")
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--worker', action='store_true', help="Internal: measure the current mode only.")
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.measure(options['requests'], options['threads'])))
+            return
+
+        self.stdout.write(f"{options['requests']} requests to {BENCH_PATH}, {options['threads']} threads")
+        baseline = None
+        for mode in options['modes']:
+            result = subprocess.run(
+                [sys.executable, sys.argv[0], 'bench_db_connections', '--worker',
+                 '--requests', str(options['requests']), '--threads', str(options['threads'])],
+                env={**os.environ, 'DB_POOL_MODE': mode},
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode:
+                self.stdout.write(self.style.ERROR(f"  {mode:<11} failed: {result.stderr.strip().splitlines()[-1]}"))
+                continue
+            rps = json.loads(result.stdout.strip().splitlines()[-1])['rps']
+            baseline = baseline or rps
+            self.stdout.write(f"  {mode:<11} {rps:8.1f} req/s  ({rps / baseline:.2f}x)")
+
+    def measure(self, total, threads):
+        user, _ = User.objects.get_or_create(username='bench-db-connections')
+        token = str(AccessToken.for_user(user))
+        handler = WSGIHandler()
+        factory = RequestFactory()
+
+        def call(_):
+            environ = factory.get(BENCH_PATH, HTTP_AUTHORIZATION=f'Bearer {token}').environ
+            response = handler(environ, lambda status, headers, exc_info=None: None)
+            # Closing the response fires request_finished, which applies the
+            # configured connection policy exactly as a real server would.
+            response.close()
+            return response.status_code
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                codes = list(pool.map(call, range(total)))
+            elapsed = time.perf_counter() - start
+        finally:
+            user.delete()
+
+        if any(code != 200 for code in codes):
+            raise RuntimeError(f"Unexpected status codes: {sorted(set(codes))}")
+        return {
+            'mode': settings.DB_POOL_MODE,
+            'rps': total / elapsed,
+        }
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import httpx
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Transaction
+
+SYNC_URL = '/api/payments/create-intent/'
+ASYNC_URL = '/api/payments/create-intent/async/'
+
+
+class MockStripeServer:
+    """Local stand-in for ``POST /v1/payment_intents`` with a fixed response latency."""
+
+    def __init__(self, latency=0.1):
+        self.latency = latency
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode())
+                time.sleep(mock.latency)
+                intent_id = f'pi_mock_{uuid.uuid4().hex}'
+                body = json.dumps({
+                    'id': intent_id,
+                    'object': 'payment_intent',
+                    'amount': int(form.get('amount', ['0'])[0]),
+                    'currency': form.get('currency', ['usd'])[0],
+                    'client_secret': f'{intent_id}_secret_mock',
+                    'status': 'requires_payment_method',
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 512
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent throughput of the sync and async payment intent views "
+        "against a local mock Stripe server. Creates and removes its own user and transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.1,
+                            help="Seconds the mock Stripe server waits before answering.")
+        parser.add_argument('--sync-workers', type=int, default=4,
+                            help="Threads serving the sync view, like a WSGI worker pool.")
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help="Requests in flight against the async view.")
+
+    def handle(self, *args, **options):
+        with MockStripeServer(options['latency']) as mock, \
+                override_settings(STRIPE_API_BASE=mock.url, STRIPE_SECRET_KEY='sk_test_mock'):
+            user, _ = User.objects.get_or_create(username='bench-payment-intents')
+            token = str(AccessToken.for_user(user))
+            try:
+                results = [
+                    ('sync', f"{options['sync_workers']} threads",
+                     *self.run_sync(token, options['requests'], options['sync_workers'])),
+                    ('async', f"{options['concurrency']} in flight",
+                     *asyncio.run(self.run_async(token, options['requests'], options['concurrency']))),
+                ]
+            finally:
+                Transaction.objects.filter(user=user).delete()
+                user.delete()
+
+        self.stdout.write(f"{options['requests']} requests, mock Stripe latency {options['latency'] * 1000:.0f} ms")
+        for name, mode, elapsed, errors in results:
+            self.stdout.write(
+                f"  {name:<6} {mode:<16} {options['requests'] / elapsed:8.1f} req/s  "
+                f"{elapsed:6.2f} s  {errors} errors"
+            )
+
+    def run_sync(self, token, total, workers):
+        def call(_):
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+            return client.post(SYNC_URL, {'amount': 1000}, content_type='application/json').status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            codes = list(pool.map(call, range(total)))
+        return time.perf_counter() - start, sum(code != 201 for code in codes)
+
+    async def run_async(self, token, total, concurrency):
+        transport = httpx.ASGITransport(app=get_asgi_application())
+        limit = asyncio.Semaphore(concurrency)
+
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            async def call():
+                async with limit:
+                    response = await client.post(
+                        ASYNC_URL, json={'amount': 1000}, headers={'Authorization': f'Bearer {token}'}
+                    )
+                    return response.status_code
+
+            start = time.perf_counter()
+            codes = await asyncio.gather(*(call() for _ in range(total)))
+        return time.perf_counter() - start, sum(code != 201 for code in codes)
@@ -0,0 +1,196 @@
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Order, Service
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'endpoints.json'
+# Synthetic users share this password (see generate_synthetic_data).
+SEED_PASSWORD = 'synthetic-password'
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API routes against seeded data and compare latency percentiles, "
+        "queries per request and allocations with a stored baseline. Seed data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--users', type=int, default=2000, help="Synthetic users to seed.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--endpoints', nargs='+', help="Only run these endpoints.")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline.")
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help="Fail when p95 grows past baseline * threshold.")
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help="Ignore p95 increases smaller than this, to absorb timer noise.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        try:
+            with transaction.atomic():
+                results = self.run()
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.report(results)
+        path = Path(options['baseline'])
+        if options['save_baseline']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}"))
+            return
+        if not path.exists():
+            self.stdout.write(f"No baseline at {path}; run with --save-baseline to create one.")
+            return
+
+        regressions = self.compare(results, json.loads(path.read_text()))
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
+
+    def run(self):
+        call_command(
+            'generate_synthetic_data', users=self.options['users'], seed=self.options['seed'],
+            prefix='bench', stdout=StringIO(),
+        )
+        # The busiest user makes the list endpoints do the most work.
+        user_id = (
+            Order.objects.values('user').annotate(total=Count('pk')).order_by('-total', 'user')
+            .values_list('user', flat=True).first()
+        )
+        user = Order.objects.filter(user_id=user_id).select_related('user').first().user
+        service = Service.objects.order_by('pk').first()
+
+        anonymous = APIClient()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        start = timezone.now() + timedelta(days=365)
+
+        endpoints = {
+            'register': lambda i: anonymous.post('/api/register/', {
+                'username': f'bench-register-{i}', 'email': f'bench-register-{i}@example.com',
+                'password': SEED_PASSWORD, 'phone_number': '+254700000000', 'gender': 'other',
+            }, format='json'),
+            'login': lambda i: anonymous.post('/api/login/', {
+                'username': user.username, 'password': SEED_PASSWORD,
+            }, format='json'),
+            'services': lambda i: anonymous.get('/api/services/'),
+            'products': lambda i: anonymous.get('/api/products/'),
+            'book': lambda i: client.post('/api/book/', {
+                'service': service.pk,
+                'appointment_time': (start + timedelta(hours=3 * i)).isoformat(),
+            }, format='json'),
+            'my-bookings': lambda i: client.get('/api/my-bookings/'),
+            'transactions': lambda i: client.get('/api/transactions/'),
+            'support/messages': lambda i: client.get('/api/support/messages/'),
+        }
+        selected = self.options['endpoints'] or list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for name in selected:
+            self.stdout.write(f"  {name}...")
+            results[name] = self.measure(endpoints[name])
+        return results
+
+    def measure(self, call):
+        iterations, warmup = self.options['iterations'], self.options['warmup']
+        counter = iter(range(10 ** 9))
+        errors = 0
+
+        def request():
+            nonlocal errors
+            response = call(next(counter))
+            if response.status_code >= 400:
+                errors += 1
+            return response
+
+        for _ in range(warmup):
+            request()
+        errors = 0
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Queries and allocations are measured in a separate pass so the
+        # instrumentation does not inflate the latency numbers above.
+        queries, allocations = [], []
+        tracemalloc.start()
+        try:
+            for _ in range(min(iterations, 20)):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                with CaptureQueriesContext(connection) as captured:
+                    request()
+                allocations.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+                queries.append(len(captured))
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': max(queries),
+            'peak_kib': round(statistics.median(allocations), 1),
+            'errors': errors,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'endpoint':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9} {'errors':>7}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<18} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+                f"{row['queries']:>8} {row['peak_kib']:>9.1f} {row['errors']:>7}"
+            )
+
+    def compare(self, results, baseline):
+        regressions = []
+        for name, row in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if row['errors'] > base['errors']:
+                regressions.append(f"{name}: {row['errors']} errors (baseline {base['errors']})")
+            if row['queries'] > base['queries']:
+                regressions.append(f"{name}: {row['queries']} queries (baseline {base['queries']})")
+            limit = max(base['p95_ms'] * self.options['threshold'], base['p95_ms'] + self.options['min_delta_ms'])
+            if row['p95_ms'] > limit:
+                regressions.append(f"{name}: p95 {row['p95_ms']:.2f} ms (baseline {base['p95_ms']:.2f} ms)")
+        return regressions
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = (
+        "Render resized WebP/JPEG variants for product images and profile pictures. "
+        "Runs as a worker; with --once it backfills existing media and exits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep when no image is waiting.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once every image has variants.")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Re-render every image, e.g. after changing VARIANT_SIZES. Implies --once.")
+
+    def handle(self, *args, **options):
+        total = 0
+        after_pk = {}
+        while True:
+            processed, last_pk = process_pending_images(options['batch_size'], options['rebuild'], after_pk)
+            after_pk.update(last_pk)
+            total += processed
+            if processed:
+                continue
+            if options['once'] or options['rebuild']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered variants for {total} images."))
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.uploads import expire_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Fail certification uploads that stopped receiving chunks and delete their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24)
+
+    def handle(self, *args, **options):
+        expired = expire_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} uploads."))
@@ -0,0 +1,241 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import (
+    Feedback,
+    Order,
+    Product,
+    ProductCategory,
+    ProductReview,
+    Profile,
+    Service,
+    SupportMessage,
+    Transaction,
+)
+
+CITIES = [
+    # (city, country, latitude, longitude)
+    ('Nairobi', 'Kenya', -1.2864, 36.8172),
+    ('Mombasa', 'Kenya', -4.0435, 39.6682),
+    ('Kampala', 'Uganda', 0.3476, 32.5825),
+    ('Dar es Salaam', 'Tanzania', -6.7924, 39.2083),
+    ('Kigali', 'Rwanda', -1.9441, 30.0619),
+    ('Lagos', 'Nigeria', 6.5244, 3.3792),
+    ('London', 'United Kingdom', 51.5072, -0.1276),
+    ('Dubai', 'United Arab Emirates', 25.2048, 55.2708),
+]
+SERVICE_NAMES = ['Haircut', 'Braids', 'Manicure', 'Pedicure', 'Facial', 'Massage', 'Makeup', 'Waxing', 'Lashes', 'Dye']
+PRODUCT_NAMES = ['Shampoo', 'Conditioner', 'Hair Oil', 'Nail Polish', 'Face Cream', 'Serum', 'Lipstick', 'Gel', 'Wax']
+ORDER_STATUSES = ['completed'] * 6 + ['confirmed'] * 2 + ['pending', 'cancelled']
+TRANSACTION_STATUSES = ['success'] * 8 + ['pending', 'failed']
+PAYMENT_METHODS = [code for code, _ in Transaction.PAYMENT_METHODS]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the generated ``created_at`` values instead of "now"."""
+    fields = [field for model in models for field in model._meta.fields if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate deterministic synthetic users, catalog, bookings, payments, reviews and support "
+        "messages with bulk inserts, for scale and performance testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--services', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders-per-user', type=float, default=5)
+        parser.add_argument('--transactions-per-user', type=float, default=3)
+        parser.add_argument('--reviews-per-user', type=float, default=1)
+        parser.add_argument('--messages-per-user', type=float, default=2)
+        parser.add_argument('--feedback-ratio', type=float, default=0.5,
+                            help="Share of completed orders that receive feedback.")
+        parser.add_argument('--provider-ratio', type=float, default=0.1)
+        parser.add_argument('--days', type=int, default=730, help="Spread created_at over this many days.")
+        parser.add_argument('--start', default='2024-01-01', help="First day of generated activity (UTC).")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='synth', help="Prefix for usernames and unique references.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.tag = f"{options['prefix']}{options['seed']}"
+        self.start = datetime.fromisoformat(options['start']).replace(tzinfo=dt_timezone.utc)
+        self.counts = {}
+
+        with explicit_timestamps(Service, Product, Order, Feedback, Transaction, ProductReview, SupportMessage, Profile):
+            category_ids = self.create_categories()
+            services = self.create_services()
+            product_ids = self.create_products(category_ids)
+            # Hash once: hashing per user would dominate the run time.
+            password = make_password('synthetic-password', salt=self.tag)
+            for offset in range(0, options['users'], options['batch_size']):
+                size = min(options['batch_size'], options['users'] - offset)
+                with transaction.atomic():
+                    user_ids = self.create_users(offset, size, password)
+                    self.create_activity(user_ids, services, product_ids)
+                self.stdout.write(f"  {offset + size}/{options['users']} users")
+
+        # bulk_create skips the signals that maintain the rating summaries and profile facets.
+        call_command('rebuild_rating_summaries', stdout=self.stdout)
+        call_command('rebuild_profile_facets', stdout=self.stdout)
+
+        total = sum(self.counts.values())
+        for model, count in self.counts.items():
+            self.stdout.write(f"  {model:<16} {count:>12,}")
+        self.stdout.write(self.style.SUCCESS(f"Created {total:,} rows."))
+
+    def bulk_create(self, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=self.options['batch_size'])
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(created)
+        return created
+
+    def random_time(self):
+        return self.start + timedelta(seconds=self.rng.randrange(self.options['days'] * 86400))
+
+    def per_user(self, average):
+        # Uniform around the average gives a realistic spread of light and heavy users.
+        return self.rng.randint(0, int(round(average * 2)))
+
+    def create_categories(self):
+        categories = self.bulk_create(ProductCategory, [
+            ProductCategory(name=f'{self.tag} Category {i}') for i in range(self.options['categories'])
+        ])
+        return [category.pk for category in categories]
+
+    def create_services(self):
+        services = self.bulk_create(Service, [
+            Service(
+                name=f'{self.rng.choice(SERVICE_NAMES)} {i}',
+                description='Synthetic service',
+                price=Decimal(self.rng.randrange(500, 20000)) / 100,
+                duration_minutes=self.rng.choice([30, 45, 60, 90, 120]),
+                created_at=self.random_time(),
+            )
+            for i in range(self.options['services'])
+        ])
+        return [(service.pk, service.price) for service in services]
+
+    def create_products(self, category_ids):
+        products = self.bulk_create(Product, [
+            Product(
+                category_id=self.rng.choice(category_ids) if category_ids else None,
+                name=f'{self.rng.choice(PRODUCT_NAMES)} {i}',
+                description='Synthetic product',
+                price=Decimal(self.rng.randrange(100, 10000)) / 100,
+                image='products/synthetic.jpg',
+                created_at=self.random_time(),
+            )
+            for i in range(self.options['products'])
+        ])
+        return [product.pk for product in products]
+
+    def create_users(self, offset, size, password):
+        # bulk_create does not send post_save, so create_user_profile never runs;
+        # profiles are inserted explicitly below.
+        users = self.bulk_create(User, [
+            User(
+                username=f'{self.tag}_{i}',
+                email=f'{self.tag}_{i}@example.com',
+                password=password,
+                date_joined=self.random_time(),
+            )
+            for i in range(offset, offset + size)
+        ])
+
+        profiles = []
+        for user in users:
+            city, country, latitude, longitude = self.rng.choice(CITIES)
+            is_provider = self.rng.random() < self.options['provider_ratio']
+            profiles.append(Profile(
+                user_id=user.pk,
+                phone_number=f'+2547{self.rng.randrange(10 ** 8):08d}',
+                gender=self.rng.choice(Profile.GENDER_CHOICES)[0],
+                city=city,
+                country=country,
+                latitude=latitude + self.rng.uniform(-0.2, 0.2),
+                longitude=longitude + self.rng.uniform(-0.2, 0.2),
+                is_service_provider=is_provider,
+                is_approved_provider=is_provider and self.rng.random() < 0.8,
+                created_at=user.date_joined,
+            ))
+        self.bulk_create(Profile, profiles)
+        return [(user.pk, user.date_joined) for user in users]
+
+    def create_activity(self, user_ids, services, product_ids):
+        orders, transactions, reviews, messages = [], [], [], []
+        for user_id, joined in user_ids:
+            for _ in range(self.per_user(self.options['orders_per_user'])):
+                created_at = self.random_time()
+                orders.append(Order(
+                    user_id=user_id,
+                    service_id=self.rng.choice(services)[0],
+                    appointment_time=created_at + timedelta(days=self.rng.randint(0, 14), minutes=30 * self.rng.randint(0, 17)),
+                    status=self.rng.choice(ORDER_STATUSES),
+                    created_at=created_at,
+                ))
+
+            for _ in range(self.per_user(self.options['transactions_per_user'])):
+                transactions.append(Transaction(
+                    user_id=user_id,
+                    amount=self.rng.choice(services)[1],
+                    payment_method=self.rng.choice(PAYMENT_METHODS),
+                    status=self.rng.choice(TRANSACTION_STATUSES),
+                    reference=f'{self.tag}-{self.counts.get("Transaction", 0) + len(transactions)}',
+                    created_at=self.random_time(),
+                ))
+
+            review_count = min(self.per_user(self.options['reviews_per_user']), len(product_ids))
+            for product_id in self.rng.sample(product_ids, review_count):
+                reviews.append(ProductReview(
+                    product_id=product_id,
+                    user_id=user_id,
+                    rating=self.rng.randint(1, 5),
+                    comment='Synthetic review',
+                    created_at=self.random_time(),
+                ))
+
+            created_at = joined
+            for turn in range(self.per_user(self.options['messages_per_user'])):
+                created_at += timedelta(minutes=self.rng.randint(1, 600))
+                messages.append(SupportMessage(
+                    user_id=user_id,
+                    message='Synthetic support message',
+                    is_from_admin=turn % 2 == 1,
+                    created_at=created_at,
+                ))
+
+        orders = self.bulk_create(Order, orders)
+        self.bulk_create(Feedback, [
+            Feedback(
+                order_id=order.pk,
+                rating=self.rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 4, 5])[0],
+                comment='Synthetic feedback',
+                created_at=order.appointment_time,
+            )
+            for order in orders
+            if order.status == 'completed' and self.rng.random() < self.options['feedback_ratio']
+        ])
+        self.bulk_create(Transaction, transactions)
+        self.bulk_create(ProductReview, reviews)
+        self.bulk_create(SupportMessage, messages)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.payments import process_stripe_events
+
+
+class Command(BaseCommand):
+    help = "Apply recorded Stripe webhook events to transactions in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to sleep when there are no new events.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once every recorded event has been processed.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_stripe_events(options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} Stripe events."))
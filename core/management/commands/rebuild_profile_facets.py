@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Trim
+
+from core.models import Profile, ProfileFacet
+
+
+class Command(BaseCommand):
+    help = "Recompute the city/country facet counts used by the Profile admin filters."
+
+    def handle(self, *args, **options):
+        facets = []
+        for field, _ in ProfileFacet.FIELD_CHOICES:
+            rows = (
+                Profile.objects.annotate(value=Trim(field))
+                .exclude(value__isnull=True).exclude(value='')
+                .values('value')
+                .annotate(count=Count('pk'))
+                .order_by()
+            )
+            facets += [ProfileFacet(field=field, value=row['value'], count=row['count']) for row in rows]
+
+        with transaction.atomic():
+            ProfileFacet.objects.all().delete()
+            ProfileFacet.objects.bulk_create(facets, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(facets)} profile facets."))
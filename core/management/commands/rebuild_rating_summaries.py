@@ -0,0 +1,54 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from core.cache import bump_catalog_version
+from core.models import Feedback, ProductRatingSummary, ProductReview, ServiceRatingSummary
+
+
+def rebuild(summary_model, ratings, group_field, batch_size):
+    """Replace every row of ``summary_model`` with totals aggregated from ``ratings``."""
+    rows = (
+        ratings.values(group_field)
+        .annotate(
+            total=Count('pk'),
+            total_sum=Sum('rating'),
+            **{f'c{i}': Count('pk', filter=Q(rating=i)) for i in range(1, 6)},
+        )
+        .order_by(group_field)
+    )
+    summaries = (
+        summary_model(
+            pk=row[group_field],
+            rating_count=row['total'],
+            rating_sum=row['total_sum'],
+            rating_average=row['total_sum'] / row['total'],
+            **{f'count_{i}': row[f'c{i}'] for i in range(1, 6)},
+        )
+        for row in rows.iterator(chunk_size=batch_size)
+    )
+
+    created = 0
+    with transaction.atomic():
+        summary_model.objects.all().delete()
+        while batch := list(islice(summaries, batch_size)):
+            summary_model.objects.bulk_create(batch)
+            created += len(batch)
+        bump_catalog_version(summary_model.catalog_namespace)
+    return created
+
+
+class Command(BaseCommand):
+    help = "Recompute service and product rating summaries from Feedback and ProductReview."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        services = rebuild(ServiceRatingSummary, Feedback.objects.all(), 'order__service', options['batch_size'])
+        products = rebuild(ProductRatingSummary, ProductReview.objects.all(), 'product', options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating summaries for {services} services and {products} products."
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Update the daily service and payment rollups from orders, feedback and transactions "
+        "changed since the last run. The first run, or --rebuild, recomputes everything."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recompute every day, e.g. after deleting orders or transactions.")
+        parser.add_argument('--interval', type=float,
+                            help="Keep running, refreshing every this many seconds.")
+
+    def handle(self, *args, **options):
+        rebuild = options['rebuild']
+        while True:
+            days = refresh_rollups(rebuild=rebuild)
+            self.stdout.write(self.style.SUCCESS(f"Refreshed rollups for {days} days."))
+            if not options['interval']:
+                break
+            rebuild = False
+            time.sleep(options['interval'])
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import PushCampaign
+from core.notifications import send_push_campaign
+
+
+class Command(BaseCommand):
+    help = "Broadcast queued push campaigns to every device with a registered Expo token."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, help="Send only this campaign id.")
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help="Maximum number of Expo requests in flight.")
+        parser.add_argument('--page-size', type=int, default=2000,
+                            help="Profiles fetched per keyset page.")
+
+    def handle(self, *args, **options):
+        if options['campaign']:
+            campaigns = PushCampaign.objects.filter(pk=options['campaign'])
+            if not campaigns.exists():
+                raise CommandError(f"Push campaign {options['campaign']} does not exist.")
+        else:
+            # 'sending' campaigns whose lease lapsed were interrupted; they resume from their cursor.
+            campaigns = PushCampaign.objects.filter(status__in=['queued', 'sending']).order_by('created_at')
+
+        for campaign in campaigns:
+            title = campaign.title
+            campaign = send_push_campaign(
+                campaign,
+                concurrency=options['concurrency'],
+                page_size=options['page_size'],
+            )
+            if campaign is None:
+                self.stdout.write(f"{title}: skipped, not queued or being sent by another run.")
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"{campaign.title}: {campaign.sent_count} sent, "
+                f"{campaign.failed_count} failed, {campaign.pruned_count} tokens pruned."
+            ))
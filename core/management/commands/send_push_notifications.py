@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import deliver_pending_notifications
+from core.utils import EXPO_MAX_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Drain the push notification outbox, sending batches of up to 100 messages per Expo call."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPO_MAX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the outbox has no due notifications.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = deliver_pending_notifications(options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} push notifications."))
@@ -0,0 +1,174 @@
+"""Serving of uploaded media (``MEDIA_URL``).
+
+Django only decides *whether* a file may be sent and with which headers.
+With ``MEDIA_SENDFILE_BACKEND`` set, the bytes are sent by the front
+server (nginx ``X-Accel-Redirect`` or Apache/lighttpd ``X-Sendfile``).
+Without it, :func:`serve_media` streams the file itself and handles
+``Range``, ``If-Range`` and conditional GETs, so development and simple
+deployments behave the same way.
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import Profile
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def media_user(request):
+    """The session user (admin) or the JWT bearer (app), if any."""
+    if getattr(request, 'user', None) is not None and request.user.is_authenticated:
+        return request.user
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def is_private(path):
+    return path.startswith(tuple(settings.PRIVATE_MEDIA_PREFIXES))
+
+
+def can_access(request, path):
+    user = media_user(request)
+    if user is None:
+        return False
+    if user.is_staff:
+        return True
+    return Profile.objects.filter(Q(certification_document=path) | Q(certification=path), user=user).exists()
+
+
+def _file_range(full_path, start, length):
+    with open(full_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _requested_range(request, size, etag, last_modified):
+    """Return ``(start, end)`` for a single satisfiable byte range, ``None`` for the
+    whole file, or ``False`` when the range cannot be satisfied."""
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(last_modified):
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Multiple ranges and other units are answered with the full file.
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes.
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found.")
+    if not os.path.isfile(full_path):
+        raise Http404("File not found.")
+    # Check access against the file safe_join resolved, not the path as sent:
+    # "./certifications/x" or "products/../certifications/x" must not look public.
+    path = os.path.relpath(full_path, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+
+    private = is_private(path)
+    if private and not can_access(request, path):
+        # Do not reveal whether a private file exists.
+        raise Http404("File not found.")
+
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = stat.st_mtime
+    headers = {
+        'ETag': etag,
+        'Last-Modified': formatdate(last_modified, usegmt=True),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (
+            'private, no-cache' if private else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+        ),
+    }
+    if private:
+        headers['Vary'] = 'Authorization, Cookie'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    backend = settings.MEDIA_SENDFILE_BACKEND
+
+    if backend == 'nginx':
+        # nginx serves the internal location itself, including Range and sendfile().
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_REDIRECT_PREFIX + path)
+    elif backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        byte_range = _requested_range(request, stat.st_size, etag, last_modified)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range is None:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=content_type)
+                response['Content-Length'] = stat.st_size
+            else:
+                # FileResponse lets the WSGI server use wsgi.file_wrapper (sendfile) when available.
+                response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            if request.method == 'HEAD':
+                response = HttpResponse(status=206, content_type=content_type)
+            else:
+                response = StreamingHttpResponse(
+                    _file_range(full_path, start, length), status=206, content_type=content_type,
+                )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = length
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
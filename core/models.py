@@ -1,7 +1,17 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Trim
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .cache import PRODUCTS, SERVICES, bump_catalog_version, mark_support_message
 
 class Service(models.Model):
     name = models.CharField(max_length=255)
@@ -9,6 +19,14 @@ class Service(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     duration_minutes = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by a database trigger on PostgreSQL (see core/search.py).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='service_search_idx'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='service_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -26,6 +44,23 @@ class Order(models.Model):
     appointment_time = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # my-bookings: filter(user).order_by('-created_at', '-id')
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'), name='order_pending_idx'),
+            # Rollups: rows changed since the checkpoint, then one day of orders at a time.
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # Availability and overlap checks: bookings of one service in a time range.
+            models.Index(
+                fields=['service', 'appointment_time'],
+                condition=~models.Q(status='cancelled'),
+                name='order_service_slot_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.service.name} ({self.status})"
@@ -54,6 +89,26 @@ class Profile(models.Model):
     latitude = models.FloatField(blank=True, null=True)
     longitude = models.FloatField(blank=True, null=True)
     certification = models.FileField(upload_to='certifications/', blank=True, null=True)
+    # Resized renditions of profile_picture; null until the image worker has run (see core/images.py).
+    picture_variants = models.JSONField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(picture_variants__isnull=True) & ~models.Q(profile_picture=''),
+                name='profile_picture_pending_idx',
+            ),
+            # City/country admin filters match the trimmed value the facet counts are built from.
+            models.Index(Trim('city'), name='profile_city_trim_idx'),
+            models.Index(Trim('country'), name='profile_country_trim_idx'),
+            # "Providers near me" bounding-box prefilter (core/geo.py).
+            models.Index(
+                fields=['latitude', 'longitude', 'user'],
+                condition=models.Q(is_service_provider=True, is_approved_provider=True),
+                name='provider_location_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.user.username
@@ -65,6 +120,27 @@ def create_user_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
+class ProfileFacet(models.Model):
+    """Distinct city/country values with profile counts, for the admin filters."""
+    FIELD_CHOICES = (
+        ('city', 'City'),
+        ('country', 'Country'),
+    )
+
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('field', 'value')
+        indexes = [
+            models.Index(fields=['field', '-count'], name='profile_facet_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.field}: {self.value} ({self.count})"
+
+
 class ProductCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
@@ -76,7 +152,20 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='products/')
+    # Resized renditions of image; null until the image worker has run (see core/images.py).
+    image_variants = models.JSONField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by a database trigger on PostgreSQL (see core/search.py).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_idx'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='product_name_trgm_idx'),
+            models.Index(fields=['id'], condition=models.Q(image_variants__isnull=True), name='product_image_pending_idx'),
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -87,6 +176,18 @@ class Feedback(models.Model):
     rating = models.IntegerField(choices=[(i, str(i)) for i in range(1, 6)])  # 1 to 5 stars
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='feedback_updated_idx'),
+            models.Index(fields=['created_at'], name='feedback_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The service rating summary is updated by signal handlers; keep it in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.order.user.username} - {self.order.service.name} ({self.rating}★)"
@@ -112,24 +213,182 @@ class Transaction(models.Model):
     reference = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='txn_user_created_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'), name='txn_pending_idx'),
+            models.Index(fields=['updated_at'], name='txn_updated_idx'),
+            models.Index(fields=['created_at'], name='txn_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} ({self.status})"
 
+class StripeEvent(models.Model):
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['received_at'], condition=models.Q(processed_at__isnull=True),
+                         name='stripe_event_unprocessed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
+
 class ProductReview(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.PositiveIntegerField()  # e.g. 1–5
+    rating = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])  # 1–5
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('product', 'user')  # Prevent duplicate reviews
 
+    def save(self, *args, **kwargs):
+        # The product rating summary is updated by signal handlers; keep it in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating}★)"
     
 
+class RatingSummary(models.Model):
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0)
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def histogram(self):
+        return {str(i): getattr(self, f'count_{i}') for i in range(1, 6)}
+
+
+class ServiceRatingSummary(RatingSummary):
+    service = models.OneToOneField(Service, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    catalog_namespace = SERVICES
+
+    def __str__(self):
+        return f"{self.service_id}: {self.rating_average:.2f} ({self.rating_count})"
+
+
+class ProductRatingSummary(RatingSummary):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    catalog_namespace = PRODUCTS
+
+    def __str__(self):
+        return f"{self.product_id}: {self.rating_average:.2f} ({self.rating_count})"
+
+
+def apply_rating_change(summary_model, key, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one rating from a summary row using F() updates."""
+    if key is None:
+        return
+    if sign > 0:
+        summary_model.objects.get_or_create(pk=key)
+    updates = {
+        'rating_count': F('rating_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+        # SET sees the old column values, so compute the new average from the new totals.
+        'rating_average': Coalesce(
+            Cast(F('rating_sum') + sign * rating, FloatField())
+            / Cast(NullIf(F('rating_count') + sign, 0), FloatField()),
+            Value(0.0),
+        ),
+    }
+    if 1 <= rating <= 5:
+        updates[f'count_{rating}'] = F(f'count_{rating}') + sign
+    # Removals never create a row: the target may itself be mid-cascade-delete.
+    summary_model.objects.filter(pk=key).update(**updates)
+    bump_catalog_version(summary_model.catalog_namespace)
+
+
+def _replace_rating(summary_model, old, new):
+    if old == new:
+        return
+    if old:
+        apply_rating_change(summary_model, old[0], old[1], -1)
+    if new:
+        apply_rating_change(summary_model, new[0], new[1], 1)
+
+
+@receiver(pre_save, sender=Feedback)
+def remember_feedback_rating(sender, instance, **kwargs):
+    instance._rating_snapshot = (
+        Feedback.objects.filter(pk=instance.pk).values_list('order__service_id', 'rating').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Feedback)
+def update_service_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _replace_rating(
+        ServiceRatingSummary,
+        getattr(instance, '_rating_snapshot', None),
+        (instance.order.service_id, instance.rating),
+    )
+
+
+@receiver(post_delete, sender=Feedback)
+def update_service_rating_on_delete(sender, instance, **kwargs):
+    service_id = Order.objects.filter(pk=instance.order_id).values_list('service_id', flat=True).first()
+    apply_rating_change(ServiceRatingSummary, service_id, instance.rating, -1)
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_product_review_rating(sender, instance, **kwargs):
+    instance._rating_snapshot = (
+        ProductReview.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ProductReview)
+def update_product_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _replace_rating(
+        ProductRatingSummary,
+        getattr(instance, '_rating_snapshot', None),
+        (instance.product_id, instance.rating),
+    )
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_change(ProductRatingSummary, instance.product_id, instance.rating, -1)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_service_catalog(sender, **kwargs):
+    bump_catalog_version(SERVICES)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_product_catalog(sender, **kwargs):
+    bump_catalog_version(PRODUCTS)
+
+
 class SupportMessage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
@@ -137,7 +396,255 @@ class SupportMessage(models.Model):
     response_to = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='support_user_created_idx'),
+        ]
+
     def __str__(self):
         direction = "Admin" if self.is_from_admin else "User"
         return f"{direction}: {self.user.username} @ {self.created_at}"
 
+
+def _reset_image_variants(instance, field, variants_field, update_fields):
+    """Clear stale variants when the image changes so the image worker renders new ones."""
+    if update_fields is not None and field not in update_fields:
+        return
+    name = getattr(instance, field).name or ''
+    previous = None
+    if instance.pk:
+        previous = type(instance).objects.filter(pk=instance.pk).values_list(field, variants_field).first()
+    if previous and (previous[0] or '') == name:
+        return
+
+    setattr(instance, variants_field, None)
+    if update_fields is not None and variants_field not in update_fields:
+        type(instance).objects.filter(pk=instance.pk).update(**{variants_field: None})
+    if previous and previous[1]:
+        from .images import delete_variant_files
+
+        storage = getattr(instance, field).storage
+        transaction.on_commit(lambda: delete_variant_files(storage, previous[1]))
+
+
+@receiver(pre_save, sender=Product)
+def reset_product_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        _reset_image_variants(instance, 'image', 'image_variants', update_fields)
+
+
+@receiver(pre_save, sender=Profile)
+def reset_profile_picture_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        _reset_image_variants(instance, 'profile_picture', 'picture_variants', update_fields)
+
+
+def facet_values(city, country):
+    return {'city': (city or '').strip(), 'country': (country or '').strip()}
+
+
+def apply_facet_change(field, value, sign):
+    """Add (sign=1) or remove (sign=-1) one profile from a facet count using F() updates."""
+    if not value:
+        return
+    if sign > 0:
+        ProfileFacet.objects.get_or_create(field=field, value=value)
+    ProfileFacet.objects.filter(field=field, value=value).update(count=F('count') + sign)
+
+
+@receiver(pre_save, sender=Profile)
+def remember_profile_facets(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_facets = None
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not {'city', 'country'} & set(update_fields):
+        return
+    previous = Profile.objects.filter(pk=instance.pk).values_list('city', 'country').first()
+    if previous:
+        instance._previous_facets = facet_values(*previous)
+
+
+@receiver(post_save, sender=Profile)
+def update_profile_facets_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_facets', None)
+    if not created and previous is None:
+        return
+    current = facet_values(instance.city, instance.country)
+    for field, value in current.items():
+        old = previous[field] if previous else ''
+        if old != value:
+            apply_facet_change(field, old, -1)
+            apply_facet_change(field, value, 1)
+
+
+@receiver(post_delete, sender=Profile)
+def update_profile_facets_on_delete(sender, instance, **kwargs):
+    for field, value in facet_values(instance.city, instance.country).items():
+        apply_facet_change(field, value, -1)
+
+
+@receiver(post_save, sender=SupportMessage)
+def publish_support_message(sender, instance, created, **kwargs):
+    # Open support streams compare this marker with their cursor before querying.
+    if created:
+        mark_support_message(instance.user_id, instance.id)
+
+
+class PushNotification(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    token = models.CharField(max_length=255)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    ticket_id = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='push_outbox_due_idx'),
+        ]
+
+    def as_expo_message(self):
+        payload = {
+            'to': self.token,
+            'title': self.title,
+            'body': self.message,
+        }
+        if self.data:
+            payload['data'] = self.data
+        return payload
+
+    def __str__(self):
+        return f"{self.title} -> {self.token} ({self.status})"
+
+
+class PushCampaign(models.Model):
+    STATUS_CHOICES = (
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('completed', 'Completed'),
+    )
+
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    last_profile_id = models.BigIntegerField(default=0, editable=False)  # keyset cursor, lets a crashed run resume
+    # The run currently sending (see notifications.claim_campaign); renewed after every window.
+    lease = models.CharField(max_length=32, blank=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    pruned_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+
+class PushTicket(models.Model):
+    campaign = models.ForeignKey(PushCampaign, on_delete=models.CASCADE, related_name='tickets')
+    profile_id = models.BigIntegerField()
+    token = models.CharField(max_length=255)
+    status = models.CharField(max_length=20)
+    ticket_id = models.CharField(max_length=255, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.token} ({self.status})"
+
+
+class CertificationUpload(models.Model):
+    """A resumable, chunked upload of a provider certification (see core/uploads.py)."""
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    FIELD_CHOICES = (
+        ('certification_document', 'Certification document'),
+        ('certification', 'Certification'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='certification_uploads')
+    field = models.CharField(max_length=30, choices=FIELD_CHOICES, default='certification_document')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    offset = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    stored_name = models.CharField(max_length=255, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], condition=models.Q(status='uploading'), name='cert_upload_stale_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.filename} ({self.offset}/{self.size})"
+
+
+class DailyServiceStats(models.Model):
+    """Bookings and ratings of one service on one day, maintained by core/rollups.py."""
+    day = models.DateField()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='daily_stats')
+    bookings = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    # Service price summed over the day's bookings that were not cancelled.
+    booked_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'service')
+        verbose_name_plural = 'daily service stats'
+
+    def __str__(self):
+        return f"{self.day} {self.service_id}: {self.bookings} bookings"
+
+
+class DailyPaymentStats(models.Model):
+    """Transactions of one payment method on one day, maintained by core/rollups.py."""
+    day = models.DateField()
+    payment_method = models.CharField(max_length=50, choices=Transaction.PAYMENT_METHODS)
+    transactions = models.PositiveIntegerField(default=0)
+    successful = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # Sum of successful transaction amounts.
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'payment_method')
+        verbose_name_plural = 'daily payment stats'
+
+    def __str__(self):
+        return f"{self.day} {self.payment_method}: {self.revenue}"
+
+
+class RollupCheckpoint(models.Model):
+    """How far ``refresh_rollups`` has read the source tables' ``updated_at``."""
+    name = models.CharField(max_length=50, primary_key=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
@@ -0,0 +1,256 @@
+"""Persistent outbox for Expo push notifications.
+
+Views only call :func:`enqueue_push_notification`, which is a single
+INSERT. The ``send_push_notifications`` management command drains the
+outbox in batches through :func:`deliver_pending_notifications`, so no
+request ever waits on exp.host.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Profile, PushCampaign, PushNotification, PushTicket
+from .utils import EXPO_MAX_BATCH_SIZE, send_push_messages
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed batch stays invisible to other workers. If a worker
+# dies mid-batch the rows simply become due again once the lease expires.
+CLAIM_LEASE = timedelta(minutes=2)
+# A sending campaign's run renews this lease after every window. Once it
+# lapses the run is presumed dead and another may resume from the cursor.
+CAMPAIGN_LEASE = timedelta(minutes=5)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+# Ticket errors that will fail the same way no matter how often we retry.
+PERMANENT_ERRORS = {'DeviceNotRegistered', 'InvalidCredentials', 'MessageTooBig'}
+
+
+def enqueue_push_notification(token, title, message, data=None):
+    return PushNotification.objects.create(
+        token=token,
+        title=title,
+        message=message,
+        data=data or {},
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 30s, 60s, 120s, ... capped at one hour."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS))
+
+
+def _claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            PushNotification.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for notification in batch:
+            notification.attempts += 1
+            notification.next_attempt_at = now + CLAIM_LEASE
+        PushNotification.objects.bulk_update(batch, ['attempts', 'next_attempt_at'])
+    return batch
+
+
+def deliver_pending_notifications(batch_size=EXPO_MAX_BATCH_SIZE):
+    """Send one batch of due notifications in a single Expo request.
+
+    Returns the number of notifications processed, so callers can loop
+    until the outbox is drained.
+    """
+    batch = _claim_batch(min(batch_size, EXPO_MAX_BATCH_SIZE))
+    if not batch:
+        return 0
+
+    try:
+        tickets = send_push_messages([n.as_expo_message() for n in batch])
+    except (requests.RequestException, ValueError) as exc:
+        logger.warning("Expo push batch of %d failed: %s", len(batch), exc)
+        tickets = [{'status': 'error', 'message': str(exc)}] * len(batch)
+
+    now = timezone.now()
+    for notification, ticket in zip(batch, tickets):
+        if ticket.get('status') == 'ok':
+            notification.status = 'sent'
+            notification.ticket_id = ticket.get('id', '')
+            notification.sent_at = now
+            notification.last_error = ''
+            continue
+
+        error = (ticket.get('details') or {}).get('error', '')
+        notification.last_error = ticket.get('message') or error
+        if error in PERMANENT_ERRORS or notification.attempts >= settings.EXPO_PUSH_MAX_ATTEMPTS:
+            notification.status = 'failed'
+        else:
+            notification.next_attempt_at = now + retry_delay(notification.attempts)
+
+    PushNotification.objects.bulk_update(
+        batch,
+        ['status', 'ticket_id', 'sent_at', 'last_error', 'next_attempt_at'],
+    )
+    return len(batch)
+
+
+def _iter_token_chunks(after_id, page_size):
+    """Stream ``(profile_id, token)`` chunks of Expo batch size.
+
+    Uses keyset pagination on the primary key, so every page is an index
+    range scan and memory stays flat no matter how many devices exist.
+    """
+    tokens = (
+        Profile.objects
+        .filter(expo_push_token__isnull=False)
+        .exclude(expo_push_token='')
+        .order_by('pk')
+        .values_list('pk', 'expo_push_token')
+    )
+    while True:
+        chunk = []
+        seen = 0
+        for profile_id, token in tokens.filter(pk__gt=after_id)[:page_size].iterator(chunk_size=page_size):
+            seen += 1
+            after_id = profile_id
+            chunk.append((profile_id, token))
+            if len(chunk) == EXPO_MAX_BATCH_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        if seen < page_size:
+            return
+
+
+def _send_chunk(messages, retries=3):
+    for attempt in range(1, retries + 1):
+        try:
+            return send_push_messages(messages)
+        except (requests.RequestException, ValueError) as exc:
+            if attempt == retries:
+                logger.warning("Giving up on campaign chunk of %d: %s", len(messages), exc)
+                return [{'status': 'error', 'message': str(exc)[:255]}] * len(messages)
+            time.sleep(2 ** attempt)
+
+
+class CampaignLeaseLost(Exception):
+    """Another run took the campaign over after this run's lease lapsed."""
+
+
+def _record_window(campaign, lease, window, results):
+    tickets = []
+    invalid_profiles = []
+    invalid_tokens = []
+    sent = failed = 0
+    for chunk, chunk_tickets in zip(window, results):
+        for (profile_id, token), ticket in zip(chunk, chunk_tickets):
+            error = (ticket.get('details') or {}).get('error', '')
+            if ticket.get('status') == 'ok':
+                sent += 1
+            else:
+                failed += 1
+                if error == 'DeviceNotRegistered':
+                    invalid_profiles.append(profile_id)
+                    invalid_tokens.append(token)
+            tickets.append(PushTicket(
+                campaign=campaign,
+                profile_id=profile_id,
+                token=token,
+                status=ticket.get('status', 'error'),
+                ticket_id=ticket.get('id', ''),
+                error=(error or ticket.get('message', ''))[:255],
+            ))
+
+    with transaction.atomic():
+        PushTicket.objects.bulk_create(tickets)
+        pruned = 0
+        if invalid_profiles:
+            pruned = Profile.objects.filter(
+                pk__in=invalid_profiles,
+                expo_push_token__in=invalid_tokens,
+            ).update(expo_push_token=None)
+        # Checkpoint and renew the lease in one go. If another run has taken
+        # the campaign over, roll this window back and leave its cursor alone.
+        renewed = PushCampaign.objects.filter(pk=campaign.pk, lease=lease).update(
+            last_profile_id=window[-1][-1][0],
+            lease_expires_at=timezone.now() + CAMPAIGN_LEASE,
+            sent_count=F('sent_count') + sent,
+            failed_count=F('failed_count') + failed,
+            pruned_count=F('pruned_count') + pruned,
+        )
+        if not renewed:
+            raise CampaignLeaseLost()
+
+def claim_campaign(campaign):
+    """Take ``campaign`` for this run and return the lease, or ``None`` if it is not ours to send.
+
+    Queued campaigns can be claimed, and so can sending campaigns whose lease
+    lapsed (an interrupted run). The conditional UPDATE lets only one of several
+    overlapping runs win, like ``_claim_batch`` does for single notifications.
+    """
+    now = timezone.now()
+    lease = uuid.uuid4().hex
+    lapsed = Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+    claimed = PushCampaign.objects.filter(
+        Q(status='queued') | Q(lapsed, status='sending'),
+        pk=campaign.pk,
+    ).update(status='sending', lease=lease, lease_expires_at=now + CAMPAIGN_LEASE)
+    if not claimed:
+        return None
+    PushCampaign.objects.filter(pk=campaign.pk, started_at__isnull=True).update(started_at=now)
+    return lease
+
+
+def send_push_campaign(campaign, concurrency=8, page_size=2000):
+    """Broadcast ``campaign`` to every profile with a push token.
+
+    Up to ``concurrency`` Expo requests are in flight at once. Results
+    are recorded per window of chunks, after which the keyset cursor is
+    checkpointed so an interrupted run resumes where it stopped.
+
+    Returns ``None`` without sending when another run holds the campaign.
+    """
+    lease = claim_campaign(campaign)
+    if lease is None:
+        return None
+    campaign.refresh_from_db()
+
+    def build_messages(chunk):
+        messages = []
+        for _, token in chunk:
+            message = {'to': token, 'title': campaign.title, 'body': campaign.message}
+            if campaign.data:
+                message['data'] = campaign.data
+            messages.append(message)
+        return messages
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            window = []
+            for chunk in _iter_token_chunks(campaign.last_profile_id, page_size):
+                window.append(chunk)
+                if len(window) == concurrency:
+                    _record_window(campaign, lease, window, list(pool.map(_send_chunk, map(build_messages, window))))
+                    window = []
+            if window:
+                _record_window(campaign, lease, window, list(pool.map(_send_chunk, map(build_messages, window))))
+    except CampaignLeaseLost:
+        logger.warning("Stopped sending campaign %s: another run took it over.", campaign.pk)
+        return None
+
+    PushCampaign.objects.filter(pk=campaign.pk, lease=lease).update(
+        status='completed', finished_at=timezone.now(), lease='', lease_expires_at=None,
+    )
+    campaign.refresh_from_db()
+    return campaign
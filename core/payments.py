@@ -0,0 +1,63 @@
+"""Stripe webhook ingestion.
+
+The webhook view only verifies the signature and records the event with
+:func:`record_stripe_event`. Transaction state changes are applied later,
+in batches, by :func:`process_stripe_events` (``manage.py process_stripe_events``).
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StripeEvent, Transaction
+
+EVENT_STATUSES = {
+    'payment_intent.succeeded': 'success',
+    'payment_intent.payment_failed': 'failed',
+}
+
+# A transaction may only move to a status from these states. A failed
+# intent can still be retried and succeed, but success is final.
+ALLOWED_FROM = {
+    'success': ['pending', 'failed'],
+    'failed': ['pending'],
+}
+
+
+def record_stripe_event(event_id, event_type, payload):
+    """Store a verified event; Stripe retries of the same event id are ignored."""
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event_id, type=event_type, payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def process_stripe_events(batch_size=500):
+    """Apply one batch of unprocessed events. Returns the number of events handled."""
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by('received_at', 'id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        final_status = {}
+        for event in events:
+            status = EVENT_STATUSES.get(event.type)
+            if status is None:
+                continue
+            intent_id = event.payload['data']['object']['id']
+            if final_status.get(intent_id) != 'success':
+                final_status[intent_id] = status
+
+        for status in ALLOWED_FROM:
+            references = [ref for ref, final in final_status.items() if final == status]
+            if references:
+                Transaction.objects.filter(
+                    reference__in=references,
+                    status__in=ALLOWED_FROM[status],
+                ).update(status=status, updated_at=timezone.now())
+
+        StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=timezone.now())
+    return len(events)
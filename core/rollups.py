@@ -0,0 +1,268 @@
+"""Daily reporting rollups.
+
+``DailyServiceStats`` (day × service) summarises orders and feedback and
+``DailyPaymentStats`` (day × payment method) summarises transactions. A row's
+day is the local date of its ``created_at``.
+
+``refresh_rollups`` reads the orders, feedback and transactions whose
+``updated_at`` is past the stored checkpoint. It works out which days those
+rows fall in and recomputes only those days from the source tables, using
+range scans over the ``created_at`` indexes. Recomputing a day is idempotent,
+so each run goes back ``OVERLAP`` before the checkpoint. That catches rows
+written by transactions that committed after the previous run had started.
+
+Deleting a source row does not touch ``updated_at``, so the day it left is
+only corrected the next time one of its rows changes, or by a ``--rebuild``.
+The same applies when an admin moves an order to another service. Orders
+are normally cancelled rather than deleted.
+
+The admin analytics dashboard reads only the rollup tables.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import DailyPaymentStats, DailyServiceStats, Feedback, Order, RollupCheckpoint, Transaction
+
+CHECKPOINT = 'daily'
+OVERLAP = timedelta(minutes=5)
+# Consecutive days are recomputed together, up to this many per query.
+MAX_RUN_DAYS = 31
+
+
+def day_range(first, last):
+    """Aware datetimes bounding the local days ``first`` to ``last``, inclusive."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first, time.min), tz)
+    end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def service_stats(first, last):
+    """Unsaved ``DailyServiceStats`` for ``first..last``."""
+    start, end = day_range(first, last)
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    feedback = Feedback.objects.filter(created_at__gte=start, created_at__lt=end)
+
+    stats = {}
+
+    def bucket(day, service_id):
+        if (day, service_id) not in stats:
+            stats[day, service_id] = DailyServiceStats(day=day, service_id=service_id)
+        return stats[day, service_id]
+
+    order_rows = (
+        orders.annotate(day=TruncDate('created_at'))
+        .values('day', 'service')
+        .annotate(
+            bookings=Count('pk'),
+            cancelled=Count('pk', filter=Q(status='cancelled')),
+            booked_value=Sum('service__price', filter=~Q(status='cancelled')),
+        )
+        .order_by()
+    )
+    for row in order_rows:
+        stat = bucket(row['day'], row['service'])
+        stat.bookings = row['bookings']
+        stat.cancelled = row['cancelled']
+        stat.booked_value = row['booked_value'] or 0
+
+    feedback_rows = (
+        feedback.annotate(day=TruncDate('created_at'))
+        .values('day', 'order__service')
+        .annotate(rating_count=Count('pk'), rating_sum=Sum('rating'))
+        .order_by()
+    )
+    for row in feedback_rows:
+        stat = bucket(row['day'], row['order__service'])
+        stat.rating_count = row['rating_count']
+        stat.rating_sum = row['rating_sum']
+
+    return list(stats.values())
+
+
+def payment_stats(first, last):
+    """Unsaved ``DailyPaymentStats`` for ``first..last``."""
+    start, end = day_range(first, last)
+    rows = (
+        Transaction.objects.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'payment_method')
+        .annotate(
+            transactions=Count('pk'),
+            successful=Count('pk', filter=Q(status='success')),
+            failed=Count('pk', filter=Q(status='failed')),
+            revenue=Sum('amount', filter=Q(status='success')),
+        )
+        .order_by()
+    )
+    return [
+        DailyPaymentStats(
+            day=row['day'],
+            payment_method=row['payment_method'],
+            transactions=row['transactions'],
+            successful=row['successful'],
+            failed=row['failed'],
+            revenue=row['revenue'] or 0,
+        )
+        for row in rows
+    ]
+
+
+def changed_days(since):
+    """Local days holding an order, feedback or transaction updated at or after ``since``."""
+    days = set()
+    for model in (Order, Feedback, Transaction):
+        days.update(
+            model.objects.filter(updated_at__gte=since)
+            .annotate(day=TruncDate('created_at'))
+            .values_list('day', flat=True).distinct().order_by()
+        )
+    return days
+
+
+def day_runs(days):
+    """Group ``days`` into ``(first, last)`` runs of consecutive days, at most ``MAX_RUN_DAYS`` long."""
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1) and (day - runs[-1][0]).days < MAX_RUN_DAYS:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def replace_days(first, last):
+    """Recompute every bucket of ``first..last`` from the source tables."""
+    services = service_stats(first, last)
+    payments = payment_stats(first, last)
+    with transaction.atomic():
+        DailyServiceStats.objects.filter(day__gte=first, day__lte=last).delete()
+        DailyPaymentStats.objects.filter(day__gte=first, day__lte=last).delete()
+        DailyServiceStats.objects.bulk_create(services, batch_size=1000)
+        DailyPaymentStats.objects.bulk_create(payments, batch_size=1000)
+
+
+def rebuild_rollups():
+    """Recompute every day from scratch. Returns the number of days."""
+    bounds = [
+        model.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        for model in (Order, Feedback, Transaction)
+    ]
+    firsts = [b['first'] for b in bounds if b['first']]
+    lasts = [b['last'] for b in bounds if b['last']]
+
+    with transaction.atomic():
+        DailyServiceStats.objects.all().delete()
+        DailyPaymentStats.objects.all().delete()
+        if not firsts:
+            return 0
+        first = timezone.localdate(min(firsts))
+        last = timezone.localdate(max(lasts))
+        days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+        for run_first, run_last in day_runs(days):
+            replace_days(run_first, run_last)
+    return len(days)
+
+
+def refresh_rollups(rebuild=False):
+    """Bring the rollups up to date. Returns the number of days recomputed.
+
+    The first run, or ``rebuild=True``, recomputes everything.
+    """
+    started = timezone.now()
+    checkpoint = RollupCheckpoint.objects.filter(name=CHECKPOINT).first()
+    if rebuild or checkpoint is None:
+        days = rebuild_rollups()
+    else:
+        changed = changed_days(checkpoint.processed_until - OVERLAP)
+        for first, last in day_runs(changed):
+            replace_days(first, last)
+        days = len(changed)
+    RollupCheckpoint.objects.update_or_create(name=CHECKPOINT, defaults={'processed_until': started})
+    return days
+
+
+def percent_of(value, maximum):
+    return round(100 * float(value) / float(maximum), 1) if maximum else 0
+
+
+def rating_average(rating_sum, rating_count):
+    return round(rating_sum / rating_count, 2) if rating_count else None
+
+
+def dashboard_data(first, last, by_month=False):
+    """Everything the analytics dashboard shows for ``first..last``, read from the rollup tables only."""
+    period = TruncMonth('day') if by_month else F('day')
+    services = DailyServiceStats.objects.filter(day__gte=first, day__lte=last)
+    payments = DailyPaymentStats.objects.filter(day__gte=first, day__lte=last)
+
+    series = defaultdict(lambda: {
+        'bookings': 0, 'cancelled': 0, 'booked_value': 0, 'rating_count': 0, 'rating_sum': 0,
+        'transactions': 0, 'revenue': 0,
+    })
+    service_rows = (
+        services.annotate(period=period).values('period')
+        .annotate(
+            bookings=Sum('bookings'), cancelled=Sum('cancelled'), booked_value=Sum('booked_value'),
+            rating_count=Sum('rating_count'), rating_sum=Sum('rating_sum'),
+        )
+        .order_by()
+    )
+    for row in service_rows:
+        series[row.pop('period')].update(row)
+    payment_rows = (
+        payments.annotate(period=period).values('period')
+        .annotate(transactions=Sum('transactions'), revenue=Sum('revenue'))
+        .order_by()
+    )
+    for row in payment_rows:
+        series[row.pop('period')].update(row)
+
+    rows = [{'period': key, **values} for key, values in sorted(series.items())]
+    max_revenue = max((row['revenue'] for row in rows), default=0)
+    max_bookings = max((row['bookings'] for row in rows), default=0)
+    for row in rows:
+        row['revenue_percent'] = percent_of(row['revenue'], max_revenue)
+        row['bookings_percent'] = percent_of(row['bookings'], max_bookings)
+        row['rating_average'] = rating_average(row['rating_sum'], row['rating_count'])
+
+    top_services = list(
+        services.values('service', 'service__name')
+        .annotate(
+            bookings=Sum('bookings'), booked_value=Sum('booked_value'),
+            rating_count=Sum('rating_count'), rating_sum=Sum('rating_sum'),
+        )
+        .order_by('-booked_value', 'service')[:10]
+    )
+    for row in top_services:
+        row['rating_average'] = rating_average(row['rating_sum'], row['rating_count'])
+
+    method_names = dict(Transaction.PAYMENT_METHODS)
+    payment_methods = list(
+        payments.values('payment_method')
+        .annotate(
+            transactions=Sum('transactions'), successful=Sum('successful'),
+            failed=Sum('failed'), revenue=Sum('revenue'),
+        )
+        .order_by('-revenue', 'payment_method')
+    )
+    for row in payment_methods:
+        row['name'] = method_names.get(row['payment_method'], row['payment_method'])
+
+    totals = {
+        key: sum(row[key] for row in rows)
+        for key in ('bookings', 'cancelled', 'booked_value', 'rating_count', 'rating_sum', 'transactions', 'revenue')
+    }
+    totals['rating_average'] = rating_average(totals['rating_sum'], totals['rating_count'])
+
+    return {
+        'series': rows,
+        'top_services': top_services,
+        'payment_methods': payment_methods,
+        'totals': totals,
+    }
@@ -0,0 +1,121 @@
+"""Catalog search for products and services.
+
+On PostgreSQL each table has a ``search_vector`` column, kept up to date by a
+trigger and covered by a GIN index. Name terms have weight A and description
+terms weight B. Results are ranked with ``ts_rank``. When the full-text query
+finds nothing (usually a typo), a trigram similarity search on ``name`` runs
+instead, backed by a ``gin_trgm_ops`` index.
+
+Other database backends fall back to ``icontains``.
+
+The extension, trigger and backfill are installed by the migrate hooks below,
+which ``CoreConfig.ready`` connects.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, Q
+
+from .models import Product, Service
+
+SEARCH_CONFIG = 'english'
+SEARCH_MODELS = (Product, Service)
+
+
+def is_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def search_queryset(queryset, term):
+    """Filter ``queryset`` (of a model with ``search_vector``) by ``term``, best match first."""
+    term = term.strip()
+    if not term:
+        return queryset.none()
+    if not is_postgres(queryset):
+        return queryset.filter(Q(name__icontains=term) | Q(description__icontains=term)).order_by('name', 'pk')
+
+    query = SearchQuery(term, search_type='websearch', config=SEARCH_CONFIG)
+    matches = (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', 'pk')
+    )
+    if matches.exists():
+        return matches
+    return (
+        queryset.filter(name__trigram_similar=term)
+        .annotate(similarity=TrigramSimilarity('name', term))
+        .order_by('-similarity', 'pk')
+    )
+
+
+class FullTextSearchAdminMixin:
+    """Admin search through the same indexes as the API, instead of ``icontains`` scans."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not is_postgres(queryset):
+            return super().get_search_results(request, queryset, search_term)
+        query = SearchQuery(search_term, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.filter(Q(search_vector=query) | Q(name__trigram_similar=search_term)), False
+
+
+def create_extensions(using='default', **kwargs):
+    """pre_migrate: the trigram opclass must exist before the indexes that use it."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+def install_search_triggers(using='default', **kwargs):
+    """post_migrate: keep ``search_vector`` in sync on every insert/update, and fill existing rows."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    tables = connection.introspection.table_names()
+    with connection.cursor() as cursor:
+        for model in SEARCH_MODELS:
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            vector = (
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({{row}}name, '')), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({{row}}description, '')), 'B')"
+            )
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector := {vector.format(row='NEW.')};
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            cursor.execute(f"""
+                CREATE OR REPLACE TRIGGER {table}_search_vector
+                BEFORE INSERT OR UPDATE OF name, description ON {table}
+                FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()
+            """)
+            cursor.execute(f"UPDATE {table} SET search_vector = {vector.format(row='')} WHERE search_vector IS NULL")
+
+
+# Admin search runs UPPER(col::text) LIKE '%term%'; these trigram indexes match that expression.
+# They are created here rather than in Meta.indexes because the opclass only exists on PostgreSQL,
+# and auth_user is not ours to add Meta.indexes to.
+ADMIN_SEARCH_INDEXES = [
+    ('auth_user_username_trgm_idx', 'auth_user', 'username'),
+    *[
+        (f'profile_{column}_trgm_idx', 'core_profile', column)
+        for column in ('phone_number', 'address', 'city', 'country')
+    ],
+]
+
+
+def install_admin_search_indexes(using='default', **kwargs):
+    """post_migrate: trigram indexes behind the User and Profile admin search boxes."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for name, table, column in ADMIN_SEARCH_INDEXES:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+            )
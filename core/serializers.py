@@ -1,6 +1,12 @@
+import os
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Profile, Service, Order,Product, Feedback, Transaction, ProductReview, SupportMessage
+from django.conf import settings
+from django.db import transaction
+from .images import variant_map
+from .models import Profile, Service, Order,Product, Feedback, Transaction, ProductReview, SupportMessage, CertificationUpload
+from .uploads import ALLOWED_EXTENSIONS
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     phone_number = serializers.CharField(write_only=True, required=True)
@@ -17,18 +23,32 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         gender = validated_data.pop('gender')
         password = validated_data.pop('password')
 
-        user = User.objects.create(**validated_data)
-        user.set_password(password)
-        user.save()
-
-        Profile.objects.create(user=user, phone_number=phone_number, gender=gender)
+        with transaction.atomic():
+            user = User.objects.create_user(password=password, **validated_data)
+            # The post_save signal has already created the profile.
+            Profile.objects.filter(user=user).update(phone_number=phone_number, gender=gender)
 
         return user
 
+def rating_summary_data(summary):
+    if summary is None:
+        return {'count': 0, 'average': None, 'histogram': {str(i): 0 for i in range(1, 6)}}
+    return {
+        'count': summary.rating_count,
+        'average': round(summary.rating_average, 2) if summary.rating_count else None,
+        'histogram': summary.histogram(),
+    }
+
 class ServiceSerializer(serializers.ModelSerializer):
+    rating = serializers.SerializerMethodField()
+
     class Meta:
         model = Service
-        fields = '__all__'
+        exclude = ['search_vector']
+
+    def get_rating(self, obj):
+        # Reads the denormalized summary; views select_related('rating_summary') so this is free.
+        return rating_summary_data(getattr(obj, 'rating_summary', None))
 
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -40,11 +60,18 @@ class ExpoPushTokenSerializer(serializers.Serializer):
     expo_push_token = serializers.CharField()
 
 class ProductSerializer(serializers.ModelSerializer):
+    image_sizes = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['image_variants', 'search_vector']
+
+    def get_image_sizes(self, obj):
+        return variant_map(obj.image, obj.image_variants, self.context.get('request'))
 
 class ProfileSerializer(serializers.ModelSerializer):
+    profile_picture_sizes = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
         fields = [
@@ -55,10 +82,14 @@ class ProfileSerializer(serializers.ModelSerializer):
             'city',
             'country',
             'profile_picture',
+            'profile_picture_sizes',
             'latitude',
             'longitude',
         ]
 
+    def get_profile_picture_sizes(self, obj):
+        return variant_map(obj.profile_picture, obj.picture_variants, self.context.get('request'))
+
 class FeedbackSerializer(serializers.ModelSerializer):
     class Meta:
         model = Feedback
@@ -73,10 +104,18 @@ class TransactionSerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category = serializers.StringRelatedField()
+    rating = serializers.SerializerMethodField()
+    image_sizes = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['image_variants', 'search_vector']
+
+    def get_rating(self, obj):
+        return rating_summary_data(getattr(obj, 'rating_summary', None))
+
+    def get_image_sizes(self, obj):
+        return variant_map(obj.image, obj.image_variants, self.context.get('request'))
 
 class ProductReviewSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
@@ -94,3 +133,44 @@ class SupportMessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'message', 'is_from_admin', 'response_to', 'created_at']
         read_only_fields = ['id', 'user', 'is_from_admin', 'created_at']
 
+
+class CertificationUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CertificationUpload
+        fields = ['id', 'field', 'filename', 'size', 'sha256', 'offset', 'status', 'error', 'chunk_size', 'created_at']
+        read_only_fields = ['id', 'offset', 'status', 'error', 'created_at']
+
+    def get_chunk_size(self, obj):
+        return settings.CERTIFICATION_UPLOAD_CHUNK_SIZE
+
+    def validate_filename(self, value):
+        if os.path.splitext(value)[1].lower() not in ALLOWED_EXTENSIONS:
+            raise serializers.ValidationError(f"Allowed file types: {', '.join(sorted(ALLOWED_EXTENSIONS))}.")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.CERTIFICATION_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.CERTIFICATION_MAX_UPLOAD_SIZE} bytes."
+            )
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+            raise serializers.ValidationError("Expected a hex SHA-256 digest.")
+        return value
+
+class NearbyProviderSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='user_id')
+    username = serializers.CharField(source='user__username')
+    city = serializers.CharField(allow_null=True)
+    country = serializers.CharField(allow_null=True)
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    distance_km = serializers.SerializerMethodField()
+
+    def get_distance_km(self, row):
+        return round(row['distance_km'], 3)
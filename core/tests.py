@@ -1,3 +1,1546 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import os
+import re
+import tempfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .admin import ProductAdmin
+from .availability import merge_intervals
+from .bookings import booking_days
+from .exports import iterate_in_thread
+from .management.commands.bench_payment_intents import MockStripeServer
+from .models import (
+    CertificationUpload,
+    DailyPaymentStats,
+    DailyServiceStats,
+    Feedback,
+    Order,
+    Product,
+    ProductCategory,
+    ProductReview,
+    Profile,
+    ProfileFacet,
+    PushCampaign,
+    PushNotification,
+    PushTicket,
+    Service,
+    ServiceRatingSummary,
+    StripeEvent,
+    SupportMessage,
+    Transaction,
+)
+from .notifications import (
+    claim_campaign,
+    deliver_pending_notifications,
+    enqueue_push_notification,
+    send_push_campaign,
+)
+from .pagination import EstimatedCountPaginator, estimated_row_count
+from .payments import process_stripe_events
+from .serializers import ProfileSerializer
+from .uploads import OffsetConflict, append_chunk, partial_path
+
+
+class StubExpoServer:
+    """Minimal local stand-in for exp.host's push/send endpoint."""
+
+    def __init__(self):
+        self.requests = []
+        self.status_code = 200
+        self.ticket_factory = lambda message: {'status': 'ok', 'id': f"ticket-{message['to']}"}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append(body)
+                if stub.status_code != 200:
+                    self.send_response(stub.status_code)
+                    self.end_headers()
+                    return
+                payload = json.dumps({'data': [stub.ticket_factory(m) for m in body]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/--/api/v2/push/send"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PushOutboxTests(TestCase):
+    def setUp(self):
+        self.stub = StubExpoServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        override = override_settings(EXPO_PUSH_URL=self.stub.url)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_booking_only_enqueues(self):
+        user = User.objects.create_user(username='booker', password='pass12345')
+        user.profile.expo_push_token = 'ExponentPushToken[booker]'
+        user.profile.save()
+        service = Service.objects.create(name='Cut', description='', price='10.00', duration_minutes=30)
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/book/', {
+            'service': service.id,
+            'appointment_time': (timezone.now() + timedelta(days=1)).isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(PushNotification.objects.filter(status='pending').count(), 1)
+        self.assertEqual(self.stub.requests, [])
+
+    def test_worker_sends_batches_of_100(self):
+        for i in range(150):
+            enqueue_push_notification(f'ExponentPushToken[{i}]', 'Hello', 'World')
+
+        self.assertEqual(deliver_pending_notifications(), 100)
+        self.assertEqual(deliver_pending_notifications(), 50)
+        self.assertEqual(deliver_pending_notifications(), 0)
+
+        self.assertEqual([len(batch) for batch in self.stub.requests], [100, 50])
+        self.assertEqual(PushNotification.objects.filter(status='sent').count(), 150)
+        self.assertEqual(
+            PushNotification.objects.get(token='ExponentPushToken[7]').ticket_id,
+            'ticket-ExponentPushToken[7]',
+        )
+
+    def test_server_error_is_retried_with_backoff(self):
+        notification = enqueue_push_notification('ExponentPushToken[x]', 'Hello', 'World')
+        self.stub.status_code = 503
+
+        self.assertEqual(deliver_pending_notifications(), 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'pending')
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending_notifications(), 0)
+
+    def test_unregistered_device_fails_without_retry(self):
+        notification = enqueue_push_notification('ExponentPushToken[gone]', 'Hello', 'World')
+        self.stub.ticket_factory = lambda message: {
+            'status': 'error',
+            'message': 'not registered',
+            'details': {'error': 'DeviceNotRegistered'},
+        }
+
+        deliver_pending_notifications()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'failed')
+
+    def test_campaign_broadcasts_in_chunks_and_prunes_invalid_tokens(self):
+        for i in range(250):
+            user = User.objects.create(username=f'device{i}')
+            Profile.objects.filter(user=user).update(expo_push_token=f'ExponentPushToken[{i}]')
+        User.objects.create(username='no-device')
+        self.stub.ticket_factory = lambda message: (
+            {'status': 'error', 'message': 'gone', 'details': {'error': 'DeviceNotRegistered'}}
+            if message['to'].endswith('[13]') else {'status': 'ok', 'id': 'ticket'}
+        )
+        campaign = PushCampaign.objects.create(title='Sale', message='20% off', status='queued')
+
+        campaign = send_push_campaign(campaign, concurrency=2, page_size=120)
+
+        self.assertEqual(sorted(len(batch) for batch in self.stub.requests), [10, 20, 20, 100, 100])
+        self.assertEqual(campaign.status, 'completed')
+        self.assertEqual((campaign.sent_count, campaign.failed_count, campaign.pruned_count), (249, 1, 1))
+        self.assertEqual(campaign.tickets.count(), 250)
+        self.assertFalse(Profile.objects.filter(expo_push_token='ExponentPushToken[13]').exists())
+
+    def test_campaign_held_by_another_run_is_skipped(self):
+        user = User.objects.create(username='device')
+        Profile.objects.filter(user=user).update(expo_push_token='ExponentPushToken[1]')
+        campaign = PushCampaign.objects.create(title='Sale', message='20% off', status='queued')
+        self.assertIsNotNone(claim_campaign(campaign))
+
+        self.assertIsNone(send_push_campaign(campaign))
+        self.assertEqual(self.stub.requests, [])
+        self.assertEqual(PushCampaign.objects.get(pk=campaign.pk).status, 'sending')
+
+    def test_campaign_with_lapsed_lease_is_resumed(self):
+        user = User.objects.create(username='device')
+        Profile.objects.filter(user=user).update(expo_push_token='ExponentPushToken[1]')
+        campaign = PushCampaign.objects.create(
+            title='Sale', message='20% off', status='sending',
+            lease='dead', lease_expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        campaign = send_push_campaign(campaign)
+
+        self.assertEqual(campaign.status, 'completed')
+        self.assertEqual(campaign.sent_count, 1)
+        self.assertEqual(campaign.lease, '')
+
+
+class ProfileAdminRatingTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(self.admin)
+        self.service = Service.objects.create(name='Cut', description='', price='10.00', duration_minutes=30)
+
+    def rate(self, user, *ratings):
+        for rating in ratings:
+            order = Order.objects.create(user=user, service=self.service, appointment_time=timezone.now())
+            Feedback.objects.create(order=order, rating=rating)
+
+    def changelist_queries(self, params=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/admin/core/profile/{params}')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        for i in range(3):
+            self.rate(User.objects.create(username=f'a{i}'), 4, 5)
+        few = self.changelist_queries('?o=13')
+        for i in range(12):
+            self.rate(User.objects.create(username=f'b{i}'), 2)
+        self.assertEqual(self.changelist_queries('?o=13'), few)
+
+    def test_rating_band_filter_and_low_rated_action(self):
+        good = User.objects.create(username='good')
+        bad = User.objects.create(username='bad')
+        unrated = User.objects.create(username='unrated')
+        self.rate(good, 5, 4)
+        self.rate(bad, 1, 2)
+
+        response = self.client.get('/admin/core/profile/?rating_band=1-2')
+        self.assertEqual([p.user for p in response.context['cl'].result_list], [bad])
+
+        response = self.client.post('/admin/core/profile/', {
+            'action': 'delete_low_rated_profiles',
+            '_selected_action': list(Profile.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(User.objects.values_list('username', flat=True)),
+            {'admin', good.username, unrated.username},
+        )
+
+
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = Service.objects.create(name='Cut', description='', price='10.00', duration_minutes=30)
+        self.other_service = Service.objects.create(name='Dye', description='', price='20.00', duration_minutes=60)
+        self.product = Product.objects.create(name='Gel', description='', price='5.00', image='products/gel.jpg')
+        self.user = User.objects.create(username='rater')
+
+    def feedback(self, service, rating):
+        order = Order.objects.create(user=self.user, service=service, appointment_time=timezone.now())
+        return Feedback.objects.create(order=order, rating=rating)
+
+    def summary(self, service):
+        summary = ServiceRatingSummary.objects.get(pk=service.pk)
+        return summary.rating_count, summary.rating_sum, summary.rating_average, summary.histogram()
+
+    def test_feedback_create_update_delete(self):
+        first = self.feedback(self.service, 5)
+        self.feedback(self.service, 2)
+        self.assertEqual(self.summary(self.service), (2, 7, 3.5, {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1}))
+
+        first.rating = 4
+        first.save()
+        self.assertEqual(self.summary(self.service), (2, 6, 3.0, {'1': 0, '2': 1, '3': 0, '4': 1, '5': 0}))
+
+        first.order.delete()
+        self.assertEqual(self.summary(self.service), (1, 2, 2.0, {'1': 0, '2': 1, '3': 0, '4': 0, '5': 0}))
+        Feedback.objects.all().delete()
+        self.assertEqual(self.summary(self.service)[:3], (0, 0, 0.0))
+
+    def test_service_delete_cascades_cleanly(self):
+        self.feedback(self.service, 3)
+        self.service.delete()
+        self.assertFalse(ServiceRatingSummary.objects.exists())
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.feedback(self.service, 5)
+        self.feedback(self.service, 1)
+        self.feedback(self.other_service, 4)
+        ProductReview.objects.create(product=self.product, user=self.user, rating=3)
+        incremental = [self.summary(self.service), self.summary(self.other_service)]
+
+        ServiceRatingSummary.objects.update(rating_count=0, rating_sum=0, rating_average=0)
+        call_command('rebuild_rating_summaries', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual([self.summary(self.service), self.summary(self.other_service)], incremental)
+        self.assertEqual(self.product.rating_summary.rating_average, 3.0)
+
+    def test_catalog_exposes_ratings_without_extra_queries(self):
+        self.feedback(self.service, 4)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/services/')
+        self.assertEqual(len(queries), 1)
+        ratings = {row['name']: row['rating'] for row in response.json()}
+        self.assertEqual(ratings['Cut']['average'], 4.0)
+        self.assertEqual(ratings['Dye'], {'count': 0, 'average': None, 'histogram': {str(i): 0 for i in range(1, 6)}})
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = ProductCategory.objects.create(name='Hair')
+        Product.objects.create(name='Gel', description='', price='5.00', image='products/gel.jpg', category=self.category)
+        Product.objects.create(name='Wax', description='', price='7.00', image='products/wax.jpg')
+
+    def test_conditional_get_returns_304_without_queries(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(cached['ETag'], etag)
+
+    def test_category_variant_is_cached_separately(self):
+        all_products = self.client.get('/api/products/')
+        hair = self.client.get(f'/api/products/?category={self.category.id}')
+        self.assertEqual([p['name'] for p in hair.json()], ['Gel'])
+        self.assertNotEqual(all_products['ETag'], hair['ETag'])
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_hosts_are_cached_separately(self):
+        good = self.client.get('/api/products/', HTTP_HOST='shop.example.com')
+        forged = self.client.get('/api/products/', HTTP_HOST='evil.example.com')
+        self.assertIn('http://evil.example.com/', forged.content.decode())
+        self.assertNotEqual(good['ETag'], forged['ETag'])
+
+        again = self.client.get('/api/products/', HTTP_HOST='shop.example.com')
+        self.assertEqual(again.content, good.content)
+        self.assertNotIn('evil.example.com', again.content.decode())
+
+    def test_saving_a_product_invalidates_the_cache(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name='Wax').get().delete()
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['name'] for p in response.json()], ['Gel'])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='heavy')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(7):
+            Transaction.objects.create(
+                user=self.user, amount='1.00', payment_method='card', status='success', reference=f'ref-{i}'
+            )
+        # Force timestamp ties so the id tiebreaker is exercised.
+        same_time = timezone.now()
+        Transaction.objects.filter(reference__in=['ref-2', 'ref-3', 'ref-4']).update(created_at=same_time)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['reference'] for row in response.json()['results'])
+            url = response.json()['next']
+        return seen
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(
+            Transaction.objects.order_by('-created_at', '-id').values_list('reference', flat=True)
+        )
+        self.assertEqual(self.walk('/api/transactions/?page_size=2'), expected)
+
+    def test_ascending_support_messages(self):
+        for i in range(5):
+            SupportMessage.objects.create(user=self.user, message=f'm{i}')
+        response = self.client.get('/api/support/messages/?page_size=3')
+        self.assertEqual([m['message'] for m in response.json()['results']], ['m0', 'm1', 'm2'])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([m['message'] for m in response.json()['results']], ['m3', 'm4'])
+        self.assertIsNone(response.json()['next'])
+
+    @override_settings(API_MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        response = self.client.get('/api/transactions/?page_size=500')
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_unpaginated_clients_keep_working(self):
+        response = self.client.get('/api/transactions/')
+        self.assertEqual(len(response.json()), 7)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/transactions/?cursor=garbage').status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    """Fail if a hot list query stops being answered by an index in order."""
+
+    def assert_index_ordered_scan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Tiny test tables make a seq scan look cheap; only accept it if no index could be used.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan, plan)
+            self.assertIsNone(re.search(r'\bSort\b', plan), plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertRegex(plan, r'USING (COVERING )?INDEX', plan)
+            self.assertNotIn('TEMP B-TREE', plan, plan)
+        else:
+            self.skipTest(f'No plan assertions for {connection.vendor}')
+
+    def test_orders_by_user(self):
+        self.assert_index_ordered_scan(Order.objects.filter(user_id=1).order_by('-created_at', '-id'))
+
+    def test_transactions_by_user(self):
+        self.assert_index_ordered_scan(Transaction.objects.filter(user_id=1).order_by('-created_at', '-id'))
+
+    def test_support_messages_by_user(self):
+        self.assert_index_ordered_scan(SupportMessage.objects.filter(user_id=1).order_by('created_at', 'id'))
+
+    def test_products_by_category(self):
+        self.assert_index_ordered_scan(Product.objects.filter(category_id=1).order_by('-created_at', '-id'))
+
+    def test_product_catalog(self):
+        self.assert_index_ordered_scan(Product.objects.order_by('-created_at', '-id'))
+
+    def test_pending_transactions(self):
+        self.assert_index_ordered_scan(Transaction.objects.filter(status='pending').order_by('created_at'))
+
+    def test_pending_orders(self):
+        self.assert_index_ordered_scan(Order.objects.filter(status='pending').order_by('created_at'))
+
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='payer')
+
+    def deliver(self, event_id, event_type, intent_id, secret=WEBHOOK_SECRET):
+        payload = json.dumps({
+            'id': event_id,
+            'object': 'event',
+            'type': event_type,
+            'data': {'object': {'id': intent_id, 'object': 'payment_intent'}},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            '/api/webhooks/stripe/',
+            data=payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}',
+        )
+
+    def transaction(self, reference, status='pending'):
+        return Transaction.objects.create(
+            user=self.user, amount='10.00', payment_method='stripe', status=status, reference=reference
+        )
+
+    def test_webhook_only_records_and_deduplicates(self):
+        txn = self.transaction('pi_1')
+        self.assertEqual(self.deliver('evt_1', 'payment_intent.succeeded', 'pi_1').status_code, 200)
+        self.assertEqual(self.deliver('evt_1', 'payment_intent.succeeded', 'pi_1').status_code, 200)
+
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        txn.refresh_from_db()
+        self.assertEqual(txn.status, 'pending')
+
+    def test_bad_signature_is_rejected(self):
+        response = self.deliver('evt_1', 'payment_intent.succeeded', 'pi_1', secret='whsec_wrong')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_processor_applies_events_in_batches(self):
+        paid, declined, retried, settled = (
+            self.transaction('pi_paid'), self.transaction('pi_declined'),
+            self.transaction('pi_retried'), self.transaction('pi_settled', status='success'),
+        )
+        self.deliver('evt_1', 'payment_intent.succeeded', 'pi_paid')
+        self.deliver('evt_2', 'payment_intent.payment_failed', 'pi_declined')
+        self.deliver('evt_3', 'payment_intent.payment_failed', 'pi_retried')
+        self.deliver('evt_4', 'payment_intent.succeeded', 'pi_retried')
+        self.deliver('evt_5', 'payment_intent.payment_failed', 'pi_settled')
+        self.deliver('evt_6', 'payment_intent.succeeded', 'pi_unknown')
+
+        self.assertEqual(process_stripe_events(batch_size=4), 4)
+        self.assertEqual(process_stripe_events(batch_size=4), 2)
+        self.assertEqual(process_stripe_events(batch_size=4), 0)
+
+        statuses = {t.reference: t.status for t in Transaction.objects.all()}
+        self.assertEqual(statuses, {
+            'pi_paid': 'success',
+            'pi_declined': 'failed',
+            'pi_retried': 'success',
+            'pi_settled': 'success',
+        })
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+
+
+class AsyncPaymentIntentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='async-payer')
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.stripe = MockStripeServer(latency=0).__enter__()
+        self.addCleanup(self.stripe.__exit__)
+
+    async def test_creates_intent_and_pending_transaction(self):
+        with override_settings(STRIPE_API_BASE=self.stripe.url, STRIPE_SECRET_KEY='sk_test_mock'):
+            response = await self.async_client.post(
+                '/api/payments/create-intent/async/',
+                {'amount': 2500, 'description': 'Gel'},
+                content_type='application/json',
+                headers=self.auth,
+            )
+
+        self.assertEqual(response.status_code, 201)
+        intent_id = response.json()['payment_intent_id']
+        txn = await Transaction.objects.aget(reference=intent_id)
+        self.assertEqual((txn.user_id, txn.status, str(txn.amount)), (self.user.id, 'pending', '25.00'))
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.post('/api/payments/create-intent/async/', {'amount': 100})
+        self.assertEqual(response.status_code, 401)
+
+
+class SupportFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='chatty')
+        self.first, self.second, self.third = [
+            SupportMessage.objects.create(user=self.user, message=text) for text in ('hi', 'anyone?', 'hello')
+        ]
+        SupportMessage.objects.create(user=User.objects.create(username='other'), message='not mine')
+
+    def test_since_id_returns_only_newer_messages(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/support/messages/?since_id={self.first.id}')
+        self.assertEqual([m['message'] for m in response.json()], ['anyone?', 'hello'])
+        self.assertEqual(client.get('/api/support/messages/?since_id=abc').status_code, 400)
+        self.assertEqual(client.get('/api/support/messages/?since_id=²').status_code, 400)
+
+    @mock.patch('core.async_views.STREAM_TIMEOUT', 0.05)
+    @mock.patch('core.async_views.STREAM_POLL_INTERVAL', 0.01)
+    async def test_stream_pushes_messages_after_cursor(self):
+        token = AccessToken.for_user(self.user)
+        response = await self.async_client.get(
+            '/api/support/messages/stream/',
+            headers={'Authorization': f'Bearer {token}', 'Last-Event-ID': str(self.first.id)},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertEqual(re.findall(r'^id: (\d+)$', body, re.M), [str(self.second.id), str(self.third.id)])
+        self.assertIn('"message":"hello"', body)
+        self.assertNotIn('not mine', body)
+
+    async def test_stream_rejects_non_ascii_digits(self):
+        token = AccessToken.for_user(self.user)
+        response = await self.async_client.get(
+            '/api/support/messages/stream/',
+            {'since_id': '²'},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SupportInboxTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(self.admin)
+
+    def conversation(self, username, *turns):
+        user = User.objects.create(username=username)
+        for from_admin in turns:
+            SupportMessage.objects.create(user=user, message=f'{username} message', is_from_admin=from_admin)
+        return user
+
+    def inbox(self, params=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/admin/support/inbox/{params}')
+        self.assertEqual(response.status_code, 200)
+        rows = {msg.user.username: msg.unread_count for msg in response.context['page']}
+        return rows, len(queries)
+
+    def test_one_row_per_user_with_unread_since_last_admin_reply(self):
+        self.conversation('waiting', False, True, False, False)
+        self.conversation('answered', False, True)
+        self.conversation('new', False)
+        resolved = self.conversation('resolved', False, False)
+        Profile.objects.filter(user=resolved).update(support_resolved=True)
+
+        rows, _ = self.inbox()
+        self.assertEqual(rows, {'waiting': 2, 'answered': 0, 'new': 1, 'resolved': 2})
+        self.assertEqual(set(self.inbox('?status=open')[0]), {'waiting', 'answered', 'new'})
+
+    def test_latest_message_follows_created_at(self):
+        user = self.conversation('imported', False, False)
+        first = SupportMessage.objects.filter(user=user).order_by('id').first()
+        SupportMessage.objects.filter(pk=first.pk).update(message='backdated last', created_at=timezone.now() + timedelta(hours=1))
+
+        response = self.client.get('/admin/support/inbox/')
+        self.assertEqual([msg.message for msg in response.context['page']], ['backdated last'])
+
+    def test_query_count_does_not_grow_with_conversations(self):
+        for i in range(2):
+            self.conversation(f'a{i}', False, True, False)
+        _, few = self.inbox()
+        for i in range(10):
+            self.conversation(f'b{i}', False, False)
+        rows, many = self.inbox()
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(many, few)
+
+    @mock.patch('core.admin.SUPPORT_THREAD_PAGE_SIZE', 2)
+    def test_thread_loads_older_messages_in_pages(self):
+        user = User.objects.create(username='long')
+        ids = [SupportMessage.objects.create(user=user, message=f'm{i}').id for i in range(5)]
+
+        response = self.client.get(f'/admin/support/thread/{user.id}/')
+        self.assertEqual([m.message for m in response.context['messages']], ['m3', 'm4'])
+        self.assertEqual(response.context['older_before'], ids[3])
+
+        response = self.client.get(f'/admin/support/thread/{user.id}/?before={ids[3]}')
+        self.assertEqual([m.message for m in response.context['messages']], ['m1', 'm2'])
+        response = self.client.get(f'/admin/support/thread/{user.id}/?before={ids[1]}')
+        self.assertEqual([m.message for m in response.context['messages']], ['m0'])
+        self.assertIsNone(response.context['older_before'])
+
+        response = self.client.get(f'/admin/support/thread/{user.id}/?before=²')
+        self.assertEqual([m.message for m in response.context['messages']], ['m3', 'm4'])
+
+
+class QueryBudgetTests(TestCase):
+    """Every changelist and list endpoint must cost the same number of queries for 3 rows as for 10."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.seeded = 0
+
+    def seed(self, count):
+        for i in range(self.seeded, self.seeded + count):
+            user = User.objects.create(username=f'user{i}')
+            service = Service.objects.create(name=f'Service {i}', description='', price='10.00', duration_minutes=30)
+            order = Order.objects.create(user=user, service=service, appointment_time=timezone.now())
+            Feedback.objects.create(order=order, rating=i % 5 + 1)
+            Order.objects.create(user=self.admin, service=service, appointment_time=timezone.now())
+            Transaction.objects.create(
+                user=user, amount='5.00', payment_method='card', status='success', reference=f'ref-{i}'
+            )
+            Transaction.objects.create(
+                user=self.admin, amount='5.00', payment_method='card', status='success', reference=f'admin-ref-{i}'
+            )
+            category = ProductCategory.objects.create(name=f'Category {i}')
+            product = Product.objects.create(
+                name=f'Product {i}', description='', price='3.00', image=f'products/{i}.jpg', category=category
+            )
+            ProductReview.objects.create(product=product, user=user, rating=4)
+            SupportMessage.objects.create(user=user, message='help')
+            SupportMessage.objects.create(user=self.admin, message=f'note {i}')
+            campaign = PushCampaign.objects.create(title=f'Campaign {i}', message='hi')
+            PushTicket.objects.create(campaign=campaign, profile_id=user.profile.id, token=f't{i}', status='ok')
+            enqueue_push_notification(f't{i}', 'Hi', 'there')
+            StripeEvent.objects.create(event_id=f'evt_{i}', type='payment_intent.succeeded', payload={})
+        self.seeded += count
+
+    def count_queries(self, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def assert_constant_queries(self, client, urls):
+        self.seed(3)
+        few = {url: self.count_queries(client, url) for url in urls}
+        self.seed(7)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(client, url), few[url])
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        urls = [
+            f'/admin/{model._meta.app_label}/{model._meta.model_name}/'
+            for model in admin.site._registry
+        ]
+        self.assertIn('/admin/core/order/', urls)
+        self.assert_constant_queries(self.client, urls + ['/admin/support/inbox/'])
+
+    def test_api_list_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        self.assert_constant_queries(client, [
+            '/api/services/',
+            '/api/products/',
+            '/api/products/?page_size=50',
+            '/api/my-bookings/',
+            '/api/my-bookings/?page_size=50',
+            '/api/transactions/',
+            '/api/support/messages/',
+            '/api/support/messages/?page_size=50',
+        ])
+
+
+
+class SyntheticDataTests(TestCase):
+    def generate(self, prefix):
+        call_command(
+            'generate_synthetic_data', users=30, services=3, categories=2, products=10,
+            prefix=prefix, seed=7, batch_size=8, stdout=StringIO(),
+        )
+        return list(
+            Order.objects.filter(user__username__startswith=prefix)
+            .order_by('id').values_list('service__name', 'status', 'created_at')
+        )
+
+    def test_generates_profiles_and_is_deterministic(self):
+        first = self.generate('a')
+        second = self.generate('b')
+
+        self.assertTrue(first)
+        self.assertEqual(first, second)
+        self.assertEqual(Profile.objects.filter(user__username__startswith='a').count(), 30)
+        self.assertFalse(Profile.objects.filter(latitude__isnull=True).exists())
+        self.assertEqual(
+            ServiceRatingSummary.objects.aggregate(total=Sum('rating_count'))['total'],
+            Feedback.objects.count(),
+        )
+
+
+class RegistrationTests(TestCase):
+    def test_register_fills_profile_created_by_signal(self):
+        response = APIClient().post('/api/register/', {
+            'username': 'newuser', 'email': 'newuser@example.com', 'password': 'pw-12345678',
+            'phone_number': '+254700000001', 'gender': 'female',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        profile = Profile.objects.get(user__username='newuser')
+        self.assertEqual((profile.phone_number, profile.gender), ('+254700000001', 'female'))
+        self.assertTrue(profile.user.check_password('pw-12345678'))
+
+
+class BenchmarkEndpointsTests(TestCase):
+    def bench(self, baseline, *extra):
+        call_command(
+            'benchmark_endpoints', '--users', '10', '--iterations', '3', '--warmup', '1',
+            '--endpoints', 'book', 'my-bookings', '--baseline', baseline, *extra, stdout=StringIO(),
+        )
+
+    def test_baseline_round_trip_and_query_regression(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, 'baseline.json')
+            self.bench(baseline, '--save-baseline')
+            with open(baseline) as f:
+                saved = json.load(f)
+            self.assertEqual(set(saved), {'book', 'my-bookings'})
+            self.assertEqual(saved['book']['errors'], 0)
+            self.assertFalse(User.objects.filter(username__startswith='bench').exists())
+
+            saved['my-bookings']['queries'] -= 1
+            saved['my-bookings']['p95_ms'] = saved['book']['p95_ms'] = 1000
+            with open(baseline, 'w') as f:
+                json.dump(saved, f)
+            with self.assertRaisesMessage(CommandError, 'my-bookings'):
+                self.bench(baseline)
+
+
+def image_upload(name, size=(1200, 800), color=(200, 40, 90)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media = media.name
+
+    def test_worker_renders_sizes_and_serializers_expose_them(self):
+        product = Product.objects.create(name='Serum', description='', price=10, image=image_upload('serum.png'))
+        self.assertIsNone(product.image_variants)
+
+        call_command('build_image_variants', '--once', stdout=StringIO())
+
+        product.refresh_from_db()
+        sizes = product.image_variants['sizes']
+        self.assertEqual(set(sizes), {'thumb', 'small', 'medium'})
+        self.assertEqual((sizes['thumb']['width'], sizes['thumb']['height']), (200, 133))
+        for fmt in ('webp', 'jpeg'):
+            self.assertTrue(os.path.exists(os.path.join(self.media, sizes['thumb'][fmt])))
+
+        data = APIClient().get('/api/products/').json()[0]
+        self.assertNotIn('image_variants', data)
+        self.assertTrue(data['image_sizes']['thumb']['webp'].endswith('serum-thumb.webp'))
+        self.assertIn('serum-thumb.webp', ProductAdmin(Product, admin.site).product_image_preview(product))
+
+    def test_replacing_the_image_discards_old_variants(self):
+        product = Product.objects.create(name='Gel', description='', price=5, image=image_upload('gel.png'))
+        call_command('build_image_variants', '--once', stdout=StringIO())
+        product.refresh_from_db()
+        old_thumb = os.path.join(self.media, product.image_variants['sizes']['thumb']['webp'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.image = image_upload('gel-v2.png', size=(300, 300))
+            product.save()
+
+        self.assertIsNone(Product.objects.get(pk=product.pk).image_variants)
+        self.assertFalse(os.path.exists(old_thumb))
+        call_command('build_image_variants', '--once', stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants['sizes']), {'thumb'})
+
+    def test_profile_picture_variants(self):
+        user = User.objects.create_user('pic', password='pw')
+        user.profile.profile_picture = image_upload('me.png', size=(500, 500))
+        user.profile.save(update_fields=['profile_picture'])
+
+        call_command('build_image_variants', '--once', stdout=StringIO())
+
+        sizes = ProfileSerializer(Profile.objects.get(user=user)).data['profile_picture_sizes']
+        self.assertEqual(set(sizes), {'original', 'thumb', 'small'})
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.body = bytes(range(256)) * 4
+        for name in ('products/photo.jpg', 'certifications/licence.pdf'):
+            os.makedirs(os.path.join(media.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(media.name, name), 'wb') as f:
+                f.write(self.body)
+
+        self.owner = User.objects.create_user('provider', password='pw')
+        Profile.objects.filter(user=self.owner).update(certification_document='certifications/licence.pdf')
+
+    def get(self, path, **headers):
+        return self.client.get(f'/media/{path}', headers=headers)
+
+    def test_public_file_has_validators_and_long_cache(self):
+        response = self.get('products/photo.jpg')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('public, max-age=', response['Cache-Control'])
+
+        self.assertEqual(self.get('products/photo.jpg', if_none_match=response['ETag']).status_code, 304)
+        self.assertEqual(self.get('products/photo.jpg', if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_range_requests(self):
+        response = self.get('products/photo.jpg', range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+
+        response = self.get('products/photo.jpg', range='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.body[-4:])
+
+        response = self.get('products/photo.jpg', range='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+        # A stale If-Range validator means the client must get the whole new file.
+        response = self.get('products/photo.jpg', range='bytes=10-19', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_certifications_are_private(self):
+        path = 'certifications/licence.pdf'
+        self.assertEqual(self.get(path).status_code, 404)
+
+        other = User.objects.create_user('other', password='pw')
+        self.assertEqual(self.get(path, authorization=f'Bearer {AccessToken.for_user(other)}').status_code, 404)
+
+        response = self.get(path, authorization=f'Bearer {AccessToken.for_user(self.owner)}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        self.assertEqual(self.get(path).status_code, 200)
+
+    def test_traversal_is_rejected(self):
+        self.assertEqual(self.get('../manage.py').status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_private_check_uses_resolved_path(self):
+        for path in (
+            './certifications/licence.pdf',
+            'products/../certifications/licence.pdf',
+            'products/%2e%2e/certifications/licence.pdf',
+        ):
+            response = self.get(path)
+            self.assertEqual(response.status_code, 404, path)
+            self.assertNotIn('X-Accel-Redirect', response, path)
+
+        # The owner still gets it, redirected to the normalized path.
+        response = self.get('products/../certifications/licence.pdf', authorization=f'Bearer {AccessToken.for_user(self.owner)}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/certifications/licence.pdf')
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_nginx_offload(self):
+        response = self.get('products/photo.jpg')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/products/photo.jpg')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(CERTIFICATION_UPLOAD_CHUNK_SIZE=4096)
+class CertificationUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('provider', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.body = os.urandom(10000)
+
+    def start(self, body=None, **overrides):
+        body = self.body if body is None else body
+        data = {'filename': 'licence.pdf', 'size': len(body), 'sha256': hashlib.sha256(body).hexdigest(), **overrides}
+        response = self.client.post('/api/profile/certification/uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return f"/api/profile/certification/uploads/{response.json()['id']}/"
+
+    def send(self, url, offset, chunk):
+        return self.client.patch(
+            url, chunk, content_type='application/offset+octet-stream', headers={'upload-offset': str(offset)},
+        )
+
+    def test_chunked_upload_resumes_and_attaches_to_profile(self):
+        url = self.start()
+        self.assertEqual(self.send(url, 0, self.body[:4096])['Upload-Offset'], '4096')
+
+        # A retry of a chunk that was already acknowledged is rejected with 409.
+        self.assertEqual(self.send(url, 0, self.body[:4096]).status_code, 409)
+        offset = int(self.client.get(url)['Upload-Offset'])
+        while offset < len(self.body):
+            response = self.send(url, offset, self.body[offset:offset + 4096])
+            offset = int(response['Upload-Offset'])
+
+        self.assertEqual(response.json()['status'], 'completed')
+        profile = Profile.objects.get(user=self.user)
+        with profile.certification_document.open('rb') as f:
+            self.assertEqual(f.read(), self.body)
+
+    def test_overlapping_requests_at_the_same_offset(self):
+        url = self.start()
+        upload = CertificationUpload.objects.get()
+
+        class SlowStream:
+            """The original request, still being received when its retry arrives and wins."""
+            def __init__(stream, data):
+                stream.data = BytesIO(data)
+                stream.retried = False
+
+            def read(stream, size):
+                if not stream.retried:
+                    stream.retried = True
+                    append_chunk(CertificationUpload.objects.get(), 0, BytesIO(self.body[:4096]), 4096)
+                return stream.data.read(size)
+
+        with self.assertRaises(OffsetConflict):
+            append_chunk(upload, 0, SlowStream(self.body[:2048]), 2048)
+        # The same stale view of the upload, sent again with different bytes.
+        with self.assertRaises(OffsetConflict):
+            append_chunk(upload, 0, BytesIO(b'x' * 4096), 4096)
+
+        with open(partial_path(upload), 'rb') as f:
+            self.assertEqual(f.read(), self.body[:4096])
+        offset = 4096
+        while offset < len(self.body):
+            offset = int(self.send(url, offset, self.body[offset:offset + 4096])['Upload-Offset'])
+        self.assertEqual(CertificationUpload.objects.get().status, 'completed')
+
+    def test_checksum_mismatch_fails_upload(self):
+        url = self.start(sha256='0' * 64, size=10)
+        response = self.send(url, 0, b'x' * 10)
+
+        self.assertEqual(response.json()['status'], 'failed')
+        self.assertFalse(Profile.objects.get(user=self.user).certification_document)
+
+    def test_limits(self):
+        url = self.start()
+        self.assertEqual(self.send(url, 0, b'x' * 5000).status_code, 413)
+        self.assertEqual(self.send(url, 9999, b'xx').status_code, 409)
+
+        response = self.client.post('/api/profile/certification/uploads/', {
+            'filename': 'run.exe', 'size': 10, 'sha256': '0' * 64,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other', password='pw'))
+        self.assertEqual(other.get(url).status_code, 404)
+
+
+class NearbyProviderTests(TestCase):
+    def provider(self, username, lat, lng, approved=True, provider=True):
+        user = User.objects.create_user(username, password='pw')
+        Profile.objects.filter(user=user).update(
+            latitude=lat, longitude=lng, is_service_provider=provider, is_approved_provider=approved,
+        )
+        return user
+
+    def setUp(self):
+        customer = self.provider('customer', -1.2864, 36.8172, provider=False)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=customer.pk))
+
+    def test_nearest_approved_providers_within_radius(self):
+        self.provider('westlands', -1.2676, 36.8108)  # ~2 km
+        self.provider('karen', -1.3197, 36.7073)      # ~13 km
+        self.provider('cbd', -1.2833, 36.8219)        # ~0.6 km
+        self.provider('pending', -1.2850, 36.8170, approved=False)
+        self.provider('mombasa', -4.0435, 39.6682)
+
+        response = self.client.get('/api/providers/nearby/', {'radius_km': 15})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['username'] for row in response.json()], ['cbd', 'westlands', 'karen'])
+        self.assertAlmostEqual(response.json()[0]['distance_km'], 0.6, delta=0.1)
+        names = [row['username'] for row in self.client.get('/api/providers/nearby/', {'radius_km': 5}).json()]
+        self.assertEqual(names, ['cbd', 'westlands'])
+
+    def test_search_wraps_around_the_antimeridian(self):
+        self.provider('east', -17.0, 179.95)
+        self.provider('west', -17.0, -179.95)
+
+        response = self.client.get('/api/providers/nearby/', {'lat': -17.0, 'lng': 179.99, 'radius_km': 20})
+
+        self.assertEqual([row['username'] for row in response.json()], ['east', 'west'])
+
+    def test_near_the_pole_every_longitude_is_searched(self):
+        self.provider('opposite', 89.95, -170.0)
+
+        response = self.client.get('/api/providers/nearby/', {'lat': 89.95, 'lng': 10.0, 'radius_km': 20})
+
+        self.assertEqual([row['username'] for row in response.json()], ['opposite'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/providers/nearby/', {'radius_km': 'far'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/providers/nearby/', {'radius_km': 5000}).status_code, 400)
+        self.assertEqual(self.client.get('/api/providers/nearby/', {'lat': 95, 'lng': 0}).status_code, 400)
+
+
+@override_settings(BOOKING_OPEN_HOUR=9, BOOKING_CLOSE_HOUR=12, BOOKING_SLOT_MINUTES=30, TIME_ZONE='UTC')
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('customer', password='pw')
+        self.service = Service.objects.create(name='Massage', description='', price=40, duration_minutes=60)
+        self.day = timezone.localdate() + timedelta(days=3)
+
+    def at(self, hour, minute=0, day=None):
+        return timezone.make_aware(datetime.combine(day or self.day, dt_time(hour, minute)))
+
+    def book(self, hour, minute=0, status='confirmed', day=None):
+        Order.objects.create(user=self.user, service=self.service, appointment_time=self.at(hour, minute, day), status=status)
+
+    def slots(self, **params):
+        params = {'start': self.day.isoformat(), 'end': self.day.isoformat(), **params}
+        response = APIClient().get(f'/api/services/{self.service.pk}/availability/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [slot[11:16] for day in response.json()['days'] for slot in day['slots']]
+
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([(5, 7), (1, 3), (2, 4), (4, 5), (9, 10)]), [(1, 7), (9, 10)])
+        self.assertEqual(merge_intervals([(1, 10), (2, 3)]), [(1, 10)])
+        self.assertEqual(merge_intervals([]), [])
+
+    def test_booking_blocks_every_overlapping_slot(self):
+        self.assertEqual(self.slots(), ['09:00', '09:30', '10:00', '10:30', '11:00'])
+
+        self.book(10)
+        # 09:30-10:30 and 10:30-11:30 both overlap 10:00-11:00; touching 09:00 and 11:00 do not.
+        self.assertEqual(self.slots(), ['09:00', '11:00'])
+
+    def test_cancelled_orders_and_other_services_are_ignored(self):
+        other = Service.objects.create(name='Nails', description='', price=10, duration_minutes=30)
+        Order.objects.create(user=self.user, service=other, appointment_time=self.at(9), status='confirmed')
+        self.book(9, status='cancelled')
+
+        self.assertEqual(len(self.slots()), 5)
+
+    def test_booking_that_starts_before_opening_still_blocks(self):
+        self.book(8, 30)
+        self.assertEqual(self.slots(), ['09:30', '10:00', '10:30', '11:00'])
+
+    def test_adjacent_bookings_merge(self):
+        self.book(9)
+        self.book(10)
+        self.book(10, 30)
+        self.assertEqual(self.slots(), [])
+
+    def test_range_uses_one_query(self):
+        next_day = self.day + timedelta(days=1)
+        self.book(11, day=next_day)
+        with self.assertNumQueries(2):  # service + orders
+            slots = self.slots(end=(self.day + timedelta(days=29)).isoformat())
+        self.assertEqual(len(slots), 30 * 5 - 2)
+
+    def test_invalid_range(self):
+        url = f'/api/services/{self.service.pk}/availability/'
+        self.assertEqual(APIClient().get(url, {'start': 'soon'}).status_code, 400)
+        end = (self.day + timedelta(days=40)).isoformat()
+        self.assertEqual(APIClient().get(url, {'start': self.day.isoformat(), 'end': end}).status_code, 400)
+
+
+class BookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('customer', password='pw')
+        self.service = Service.objects.create(name='Braids', description='', price=30, duration_minutes=90)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=7)
+
+    def book(self, offset_minutes):
+        return self.client.post('/api/book/', {
+            'service': self.service.pk,
+            'appointment_time': (self.start + timedelta(minutes=offset_minutes)).isoformat(),
+        }, format='json')
+
+    def test_one_insert_per_booking(self):
+        self.assertEqual(self.book(0).status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book(0).status_code, 201)
+
+        response = self.book(60)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('appointment_time', response.json())
+        self.assertEqual(self.book(-89).status_code, 400)
+        # Back-to-back bookings touch but do not overlap.
+        self.assertEqual(self.book(90).status_code, 201)
+        self.assertEqual(self.book(-90).status_code, 201)
+
+    def test_cancelled_booking_frees_the_slot(self):
+        self.book(0)
+        Order.objects.update(status='cancelled')
+        self.assertEqual(self.book(30).status_code, 201)
+
+    def test_booking_days_cover_midnight(self):
+        start = timezone.make_aware(datetime(2025, 3, 1, 23, 30))
+        self.assertEqual(
+            booking_days(start, start + timedelta(hours=1)),
+            [datetime(2025, 3, 1).date(), datetime(2025, 3, 2).date()],
+        )
+        self.assertEqual(len(booking_days(start, start + timedelta(minutes=30))), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Needs concurrent transactions and advisory locks")
+class BookingConcurrencyTests(TransactionTestCase):
+    def test_parallel_bookings_never_overlap(self):
+        users = [User.objects.create_user(f'racer{i}', password='pw') for i in range(20)]
+        service = Service.objects.create(name='Cut', description='', price=20, duration_minutes=60)
+        other = Service.objects.create(name='Nails', description='', price=10, duration_minutes=60)
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=3)
+        # 300 requests over 30-minute steps, so neighbouring slots overlap and about half must fail.
+        attempts = [(users[i % 20], service if i % 5 else other, start + timedelta(minutes=30 * (i % 24)))
+                    for i in range(300)]
+        barrier = threading.Barrier(30)
+
+        def attempt(args):
+            user, svc, when = args
+            try:
+                client = APIClient()
+                client.force_authenticate(user)
+                try:
+                    barrier.wait(timeout=5)
+                except threading.BrokenBarrierError:
+                    pass
+                response = client.post('/api/book/', {
+                    'service': svc.pk, 'appointment_time': when.isoformat(),
+                }, format='json')
+                return response.status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=30) as pool:
+            codes = list(pool.map(attempt, attempts))
+
+        self.assertEqual(set(codes) - {201, 400}, set())
+        self.assertEqual(codes.count(201), Order.objects.count())
+        for svc in (service, other):
+            times = sorted(Order.objects.filter(service=svc).values_list('appointment_time', flat=True))
+            self.assertTrue(times)
+            for earlier, later in zip(times, times[1:]):
+                self.assertGreaterEqual(later - earlier, timedelta(minutes=60))
+
+
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        self.oil = Product.objects.create(name='Argan Oil', description='Cold pressed hair oil', price=12, image='p/a.jpg')
+        self.mask = Product.objects.create(name='Hair Mask', description='With argan and shea', price=9, image='p/b.jpg')
+        Product.objects.create(name='Nail Polish', description='Red', price=4, image='p/c.jpg')
+        Service.objects.create(name='Argan Hair Treatment', description='', price=30, duration_minutes=45)
+
+    def search(self, **params):
+        response = APIClient().get('/api/search/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_searches_products_and_services(self):
+        results = self.search(q='argan')
+
+        self.assertEqual({row['name'] for row in results['products']}, {'Argan Oil', 'Hair Mask'})
+        self.assertEqual([row['name'] for row in results['services']], ['Argan Hair Treatment'])
+        self.assertNotIn('search_vector', results['products'][0])
+        self.assertEqual(list(self.search(q='argan', type='services')), ['services'])
+        self.assertEqual(APIClient().get('/api/search/').status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', "Full-text ranking and trigrams need PostgreSQL")
+    def test_name_matches_rank_first_and_typos_fall_back_to_trigrams(self):
+        self.assertEqual([row['name'] for row in self.search(q='argan', type='products')['products']],
+                         ['Argan Oil', 'Hair Mask'])
+        self.assertEqual([row['name'] for row in self.search(q='argn oil', type='products')['products']],
+                         ['Argan Oil'])
+
+        # The trigger keeps the vector current on update.
+        Product.objects.filter(pk=self.mask.pk).update(name='Shea Mask', description='')
+        self.assertEqual([row['name'] for row in self.search(q='argan', type='products')['products']],
+                         ['Argan Oil'])
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/admin/core/product/', {'q': 'argan'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Argan Oil')
+        self.assertNotContains(response, 'Nail Polish')
+
+
+class ProfileFacetTests(TestCase):
+    def make(self, username, city, country='Kenya'):
+        user = User.objects.create_user(username, password='pw')
+        user.profile.city = city
+        user.profile.country = country
+        user.profile.save()
+        return user
+
+    def facets(self):
+        return dict(
+            ((field, value), count)
+            for field, value, count in ProfileFacet.objects.filter(count__gt=0).values_list('field', 'value', 'count')
+        )
+
+    def test_counts_follow_saves_and_deletes(self):
+        alice = self.make('alice', 'Nairobi')
+        self.make('bob', 'Nairobi ')
+        self.make('carol', 'Kampala', 'Uganda')
+        self.assertEqual(self.facets(), {
+            ('city', 'Nairobi'): 2, ('city', 'Kampala'): 1, ('country', 'Kenya'): 2, ('country', 'Uganda'): 1,
+        })
+
+        alice.profile.city = 'Mombasa'
+        alice.profile.save()
+        alice.profile.save(update_fields=['phone_number'])
+        User.objects.get(username='carol').delete()
+        expected = {('city', 'Nairobi'): 1, ('city', 'Mombasa'): 1, ('country', 'Kenya'): 2}
+        self.assertEqual(self.facets(), expected)
+
+        ProfileFacet.objects.all().delete()
+        call_command('rebuild_profile_facets', stdout=StringIO())
+        self.assertEqual(self.facets(), expected)
+
+    def test_admin_filters_and_search(self):
+        self.make('alice', 'Nairobi')
+        self.make('bob', 'Kampala', 'Uganda')
+        self.make('nairobi_fan', 'Kigali', 'Rwanda')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+        response = self.client.get('/admin/core/profile/')
+        self.assertContains(response, 'Nairobi (1)')
+        self.assertContains(response, 'Uganda (1)')
+
+        response = self.client.get('/admin/core/profile/', {'city': 'Kampala'})
+        self.assertEqual([p.user.username for p in response.context['cl'].result_list], ['bob'])
+
+        # Matches the city of one profile and the username of another.
+        response = self.client.get('/admin/core/profile/', {'q': 'nairobi'})
+        self.assertEqual(
+            sorted(p.user.username for p in response.context['cl'].result_list), ['alice', 'nairobi_fan'],
+        )
+        response = self.client.get('/admin/core/profile/', {'q': 'nairobi kenya'})
+        self.assertEqual([p.user.username for p in response.context['cl'].result_list], ['alice'])
+
+        # Counted under "Nairobi", so the "Nairobi" filter must include it too.
+        self.make('dave', 'Nairobi ')
+        response = self.client.get('/admin/core/profile/', {'city': 'Nairobi'})
+        self.assertEqual(sorted(p.user.username for p in response.context['cl'].result_list), ['alice', 'dave'])
+
+    def test_changelist_paginator_count(self):
+        for i in range(3):
+            self.make(f'user{i}', 'Nairobi')
+        paginator = EstimatedCountPaginator(Profile.objects.order_by('pk'), 100)
+        if connection.vendor != 'postgresql':
+            self.assertIsNone(estimated_row_count(Profile.objects.all()))
+            self.assertEqual(paginator.count, 3)
+            return
+        paginator.exact_count_threshold = 0
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_profile')
+        self.assertGreaterEqual(paginator.count, 1)
+        self.assertIsNotNone(estimated_row_count(Profile.objects.filter(city='Nairobi')))
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('client', password='pw')
+        self.cut = Service.objects.create(name='Cut', description='', price='20.00', duration_minutes=30)
+        self.color = Service.objects.create(name='Color', description='', price='50.00', duration_minutes=60)
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+    def at(self, day, hour=12):
+        return timezone.make_aware(datetime.combine(day, dt_time(hour)))
+
+    def order(self, service, day, status='confirmed', rating=None):
+        order = Order.objects.create(user=self.user, service=service, appointment_time=self.at(day), status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=self.at(day))
+        if rating:
+            feedback = Feedback.objects.create(order=order, rating=rating)
+            Feedback.objects.filter(pk=feedback.pk).update(created_at=self.at(day))
+        return order
+
+    def payment(self, day, amount, method='card', status='success'):
+        txn = Transaction.objects.create(
+            user=self.user, amount=amount, payment_method=method, status=status, reference=f'ref-{Transaction.objects.count()}',
+        )
+        Transaction.objects.filter(pk=txn.pk).update(created_at=self.at(day))
+        return txn
+
+    def service_stats(self):
+        return {
+            (row.day, row.service_id): (row.bookings, row.cancelled, row.booked_value, row.rating_count, row.rating_sum)
+            for row in DailyServiceStats.objects.all()
+        }
+
+    def payment_stats(self):
+        return {
+            (row.day, row.payment_method): (row.transactions, row.successful, row.failed, row.revenue)
+            for row in DailyPaymentStats.objects.all()
+        }
+
+    def test_incremental_refresh_recomputes_only_changed_days(self):
+        earlier = self.today - timedelta(days=3)
+        self.order(self.color, earlier)
+        first = self.order(self.cut, self.yesterday, rating=4)
+        self.order(self.cut, self.yesterday, status='cancelled')
+        self.order(self.color, self.yesterday, rating=5)
+        self.payment(self.yesterday, '20.00')
+        self.payment(self.yesterday, '15.00', status='failed')
+        call_command('refresh_rollups', stdout=StringIO())
+
+        self.assertEqual(self.service_stats(), {
+            (earlier, self.color.pk): (1, 0, Decimal('50.00'), 0, 0),
+            (self.yesterday, self.cut.pk): (2, 1, Decimal('20.00'), 1, 4),
+            (self.yesterday, self.color.pk): (1, 0, Decimal('50.00'), 1, 5),
+        })
+        self.assertEqual(self.payment_stats(), {(self.yesterday, 'card'): (2, 1, 1, Decimal('20.00'))})
+
+        # Move every source row behind the checkpoint, then tamper with a bucket of an unchanged day:
+        # only days touched by a change are recomputed, so the tampered value survives.
+        old = timezone.now() - timedelta(days=1)
+        for model in (Order, Feedback, Transaction):
+            model.objects.update(updated_at=old)
+        DailyServiceStats.objects.filter(day=earlier).update(bookings=99)
+
+        first = Order.objects.get(pk=first.pk)
+        first.status = 'cancelled'
+        first.save()
+        self.order(self.color, self.today)
+        self.payment(self.today, '50.00', method='paypal')
+        call_command('refresh_rollups', stdout=StringIO())
+
+        self.assertEqual(self.service_stats(), {
+            (earlier, self.color.pk): (99, 0, Decimal('50.00'), 0, 0),
+            (self.yesterday, self.cut.pk): (2, 2, Decimal('0.00'), 1, 4),
+            (self.yesterday, self.color.pk): (1, 0, Decimal('50.00'), 1, 5),
+            (self.today, self.color.pk): (1, 0, Decimal('50.00'), 0, 0),
+        })
+        self.assertEqual(self.payment_stats(), {
+            (self.yesterday, 'card'): (2, 1, 1, Decimal('20.00')),
+            (self.today, 'paypal'): (1, 1, 0, Decimal('50.00')),
+        })
+
+        call_command('refresh_rollups', '--rebuild', stdout=StringIO())
+        self.assertEqual(self.service_stats()[earlier, self.color.pk][0], 1)
+
+    def test_stripe_status_change_is_picked_up(self):
+        txn = self.payment(self.yesterday, '30.00', method='stripe', status='pending')
+        Transaction.objects.filter(pk=txn.pk).update(reference='pi_rollup')
+        call_command('refresh_rollups', stdout=StringIO())
+        Transaction.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+        StripeEvent.objects.create(
+            event_id='evt_rollup', type='payment_intent.succeeded', payload={'data': {'object': {'id': 'pi_rollup'}}},
+        )
+        process_stripe_events()
+        call_command('refresh_rollups', stdout=StringIO())
+        self.assertEqual(self.payment_stats(), {(self.yesterday, 'stripe'): (1, 1, 0, Decimal('30.00'))})
+
+    def test_dashboard_reads_only_rollups(self):
+        self.order(self.cut, self.yesterday, rating=3)
+        self.payment(self.yesterday, '20.00')
+        self.payment(self.today - timedelta(days=200), '70.00', method='paypal')
+        call_command('refresh_rollups', stdout=StringIO())
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/analytics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['totals']['revenue'], Decimal('20.00'))
+        self.assertEqual(response.context['totals']['rating_average'], 3)
+        self.assertEqual(response.context['top_services'][0]['service__name'], 'Cut')
+        for table in (Order._meta.db_table, Feedback._meta.db_table, Transaction._meta.db_table):
+            self.assertFalse(any(f'"{table}"' in query['sql'] for query in queries.captured_queries), table)
+
+        response = self.client.get('/admin/analytics/', {'range': 'all'})
+        self.assertTrue(response.context['by_month'])
+        self.assertEqual(response.context['totals']['revenue'], Decimal('90.00'))
+        self.assertEqual([row['payment_method'] for row in response.context['payment_methods']], ['paypal', 'card'])
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', email='alice@example.com', password='pw')
+        self.bob = User.objects.create_user('bob', password='pw')
+        self.cut = Service.objects.create(name='Cut', description='', price='20.00', duration_minutes=30)
+        when = timezone.now() + timedelta(days=1)
+        self.orders = [
+            Order.objects.create(user=self.alice, service=self.cut, appointment_time=when, status='confirmed'),
+            Order.objects.create(user=self.bob, service=self.cut, appointment_time=when, status='confirmed'),
+            Order.objects.create(user=self.alice, service=self.cut, appointment_time=when, status='cancelled'),
+        ]
+        Transaction.objects.create(
+            user=self.alice, amount='20.00', payment_method='card', status='success',
+            reference='ref-1', description='=HYPERLINK("http://example.com")',
+        )
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_view_follows_changelist_filters(self):
+        response = self.client.get('/admin/core/order/', {'status': 'confirmed'})
+        self.assertContains(response, 'href="/admin/core/order/export/?status=confirmed&amp;format=csv"')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/core/order/export/', {'status': 'confirmed', 'q': 'alice', 'format': 'csv'})
+            lines = self.read(response).splitlines()
+        self.assertIn('attachment; filename="order-', response['Content-Disposition'])
+        self.assertEqual(lines[0], 'id,user,email,service,price,appointment_time,status,created_at')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.orders[0].pk},alice,alice@example.com,Cut,20.00,'))
+        # One joined query for the rows; no COUNT for pagination.
+        order_queries = [q['sql'] for q in queries.captured_queries if '"core_order"' in q['sql']]
+        self.assertEqual(len(order_queries), 1)
+        self.assertIn('JOIN "core_service"', order_queries[0])
+        self.assertNotIn('COUNT(', order_queries[0])
+
+        response = self.client.get('/admin/core/order/export/', {'status': 'confirmed', 'format': 'jsonl'})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(sorted(row['user'] for row in rows), ['alice', 'bob'])
+
+        response = self.client.get('/admin/core/order/export/', {'bogus': '1'})
+        self.assertRedirects(response, '/admin/core/order/?e=1', fetch_redirect_response=False)
+
+    def test_admin_action_exports_selection(self):
+        response = self.client.post('/admin/core/order/', {
+            'action': 'export_jsonl',
+            '_selected_action': [self.orders[0].pk, self.orders[2].pk],
+        })
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(sorted(row['id'] for row in rows), [self.orders[0].pk, self.orders[2].pk])
+        self.assertEqual(rows[0]['service'], 'Cut')
+
+        response = self.client.post('/admin/core/transaction/', {
+            'action': 'export_csv',
+            '_selected_action': list(Transaction.objects.values_list('pk', flat=True)),
+        })
+        # Spreadsheet formulas are neutralised.
+        self.assertIn('"\'=HYPERLINK(""http://example.com"")"', self.read(response))
+
+    def test_export_requires_staff(self):
+        self.client.force_login(self.bob)
+        response = self.client.get('/admin/core/order/export/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/admin/login/', response['Location'])
+
+    def test_asgi_iteration_is_lazy(self):
+        pulled = []
+
+        def lines():
+            for n in range(3):
+                pulled.append(n)
+                yield f'{n}\n'
+
+        async def first_item():
+            iterator = iterate_in_thread(lines())
+            item = await iterator.__anext__()
+            await iterator.aclose()
+            return item
+
+        self.assertEqual(async_to_sync(first_item)(), '0\n')
+        self.assertEqual(pulled, [0])
@@ -0,0 +1,142 @@
+"""Resumable, chunked uploads of provider certifications.
+
+The client creates a :class:`~core.models.CertificationUpload` with the file's
+size and SHA-256, then PATCHes raw chunks with an ``Upload-Offset`` header.
+Each chunk is copied from the request stream to a temporary file in small
+pieces, so memory use does not depend on the chunk size, and is appended to
+the partial file only by the request that claims its offset. After a dropped
+connection the client asks for the acknowledged offset and continues from
+there. Once the last byte arrives the checksum is verified and the file is
+attached to the profile.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import CertificationUpload, Profile
+
+ALLOWED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png'}
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class OffsetConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Upload-Offset does not match the uploaded size."
+    default_code = 'offset_conflict'
+
+
+class ChunkTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Chunk is larger than allowed."
+    default_code = 'chunk_too_large'
+
+
+def partial_path(upload):
+    # Under certifications/ so the media view never serves it to anyone but staff.
+    return os.path.join(settings.MEDIA_ROOT, 'certifications', 'partial', f'{upload.pk}.part')
+
+
+def append_chunk(upload, offset, stream, length):
+    """Write ``length`` bytes from ``stream`` at ``offset``. Returns the refreshed upload."""
+    if upload.status != 'uploading' or offset != upload.offset:
+        raise OffsetConflict()
+    if length > settings.CERTIFICATION_UPLOAD_CHUNK_SIZE:
+        raise ChunkTooLarge()
+    if offset + length > upload.size:
+        raise ChunkTooLarge("Chunk extends past the declared file size.")
+
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Receive into a file of this request's own: a retry overlapping the original
+    # request, or two racing PATCHes, must not both write to the partial file.
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as chunk:
+        received = 0
+        while received < length:
+            piece = stream.read(min(COPY_BUFFER_SIZE, length - received))
+            if not piece:
+                # Client went away; keep what arrived so the retry can resume from here.
+                break
+            chunk.write(piece)
+            received += len(piece)
+
+        with transaction.atomic():
+            # The conditional UPDATE both claims the offset and locks the row until
+            # commit, so only the winner touches the partial file.
+            claimed = CertificationUpload.objects.filter(
+                pk=upload.pk, offset=offset, status='uploading',
+            ).update(offset=offset + received, updated_at=timezone.now())
+            if not claimed:
+                raise OffsetConflict()
+            chunk.seek(0)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                f.seek(offset)
+                shutil.copyfileobj(chunk, f, COPY_BUFFER_SIZE)
+                f.truncate()
+                f.flush()
+                # The offset is acknowledged to the client, so the bytes must be on disk first.
+                os.fsync(f.fileno())
+
+    upload.refresh_from_db()
+    if upload.offset == upload.size:
+        complete_upload(upload)
+    return upload
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(upload):
+    path = partial_path(upload)
+    if file_sha256(path) != upload.sha256:
+        upload.status = 'failed'
+        upload.error = "Checksum mismatch."
+        upload.save(update_fields=['status', 'error', 'updated_at'])
+        os.remove(path)
+        return
+
+    with transaction.atomic():
+        profile = Profile.objects.select_for_update().get(user_id=upload.user_id)
+        previous = getattr(profile, upload.field)
+        with open(path, 'rb') as f:
+            name = default_storage.save(f'certifications/{get_valid_filename(upload.filename)}', File(f))
+        setattr(profile, upload.field, name)
+        profile.save(update_fields=[upload.field])
+        upload.status = 'completed'
+        upload.stored_name = name
+        upload.save(update_fields=['status', 'stored_name', 'updated_at'])
+        if previous:
+            old_name = previous.name
+            transaction.on_commit(lambda: default_storage.delete(old_name))
+    os.remove(path)
+
+
+def expire_stale_uploads(max_age=timedelta(days=1)):
+    """Fail uploads that stopped receiving chunks and remove their partial files."""
+    stale = list(CertificationUpload.objects.filter(
+        status='uploading', updated_at__lt=timezone.now() - max_age,
+    ))
+    for upload in stale:
+        try:
+            os.remove(partial_path(upload))
+        except FileNotFoundError:
+            pass
+    CertificationUpload.objects.filter(pk__in=[upload.pk for upload in stale], status='uploading').update(
+        status='failed', error="Expired.", updated_at=timezone.now(),
+    )
+    return len(stale)
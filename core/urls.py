@@ -14,7 +14,13 @@ TransactionListView,
 CreateProductReviewView,
 SupportMessageListCreateView,
 AdminSupportMessageView,
+CertificationUploadCreateView,
+CertificationUploadView,
+NearbyProviderListView,
+ServiceAvailabilityView,
+CatalogSearchView,
 )
+from .async_views import AsyncCreatePaymentIntentView, SupportMessageStreamView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
@@ -22,16 +28,23 @@ urlpatterns = [
     path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('services/', ServiceListView.as_view(), name='service_list'),
+    path('providers/nearby/', NearbyProviderListView.as_view(), name='nearby-providers'),
+    path('services/<int:pk>/availability/', ServiceAvailabilityView.as_view(), name='service-availability'),
+    path('search/', CatalogSearchView.as_view(), name='catalog-search'),
     path('book/', CreateOrderView.as_view(), name='create_order'),
     path('my-bookings/', UserOrderListView.as_view(), name='user_order_list'),
     path('save-token/', SaveExpoPushTokenView.as_view(), name='save_expo_token'),
     path('products/', ProductListView.as_view(), name='products'),
     path('profile/', UserProfileView.as_view(), name='profile'),
+    path('profile/certification/uploads/', CertificationUploadCreateView.as_view(), name='certification-upload-create'),
+    path('profile/certification/uploads/<uuid:pk>/', CertificationUploadView.as_view(), name='certification-upload'),
     path('feedback/', FeedbackCreateView.as_view(), name='submit-feedback'),
     path('payments/create-intent/', CreatePaymentIntentView.as_view(), name='create-payment-intent'),
+    path('payments/create-intent/async/', AsyncCreatePaymentIntentView.as_view(), name='create-payment-intent-async'),
     path('webhooks/stripe/', StripeWebhookView.as_view(), name='stripe-webhook'),
     path('transactions/', TransactionListView.as_view(), name='transaction-history'),
     path('products/review/', CreateProductReviewView.as_view(), name='create-product-review'),
     path('support/messages/', SupportMessageListCreateView.as_view(), name='support-messages'),
+    path('support/messages/stream/', SupportMessageStreamView.as_view(), name='support-messages-stream'),
     path('support/admin/send/', AdminSupportMessageView.as_view(), name='admin-support-send'),
 ]
@@ -1,15 +1,114 @@
+import asyncio
+import weakref
+
+import httpx
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# Expo accepts at most 100 messages per push/send request.
+EXPO_MAX_BATCH_SIZE = 100
+
+_push_session = None
+
+
+def get_push_session():
+    """Return the process-wide HTTP session used for Expo calls.
+
+    Reusing one session keeps TLS connections to exp.host alive between
+    batches instead of paying a fresh handshake per notification.
+    """
+    global _push_session
+    if _push_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.EXPO_PUSH_POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        if settings.EXPO_ACCESS_TOKEN:
+            session.headers['Authorization'] = f'Bearer {settings.EXPO_ACCESS_TOKEN}'
+        _push_session = session
+    return _push_session
+
+
+def send_push_messages(messages):
+    """Send up to ``EXPO_MAX_BATCH_SIZE`` messages in a single Expo call.
+
+    Returns the list of push tickets, in the same order as ``messages``.
+    Raises ``requests.RequestException`` on transport or HTTP errors.
+    """
+    if len(messages) > EXPO_MAX_BATCH_SIZE:
+        raise ValueError(f"Expo accepts at most {EXPO_MAX_BATCH_SIZE} messages per request.")
+    response = get_push_session().post(
+        settings.EXPO_PUSH_URL,
+        json=messages,
+        timeout=settings.EXPO_PUSH_TIMEOUT,
+    )
+    response.raise_for_status()
+    tickets = response.json().get('data', [])
+    if len(tickets) != len(messages):
+        raise ValueError(f"Expected {len(messages)} push tickets, got {len(tickets)}.")
+    return tickets
+
 
 def send_push_notification(token, title, message):
-    url = 'https://exp.host/--/api/v2/push/send'
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json',
-    }
     payload = {
         'to': token,
         'title': title,
         'body': message,
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_push_session().post(
+        settings.EXPO_PUSH_URL,
+        json=payload,
+        timeout=settings.EXPO_PUSH_TIMEOUT,
+    )
     return response.json()
+
+
+# One pooled async client per event loop: under ASGI that is a single client
+# shared by every request the worker serves.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+            ),
+            timeout=settings.ASYNC_HTTP_TIMEOUT,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+class StripeRequestError(Exception):
+    pass
+
+
+async def create_stripe_payment_intent(amount, currency, description='', metadata=None):
+    """Create a PaymentIntent through Stripe's REST API without blocking the event loop."""
+    data = {
+        'amount': amount,
+        'currency': currency,
+        'description': description,
+    }
+    for key, value in (metadata or {}).items():
+        data[f'metadata[{key}]'] = value
+
+    response = await get_async_http_client().post(
+        f'{settings.STRIPE_API_BASE}/v1/payment_intents',
+        data=data,
+        auth=(settings.STRIPE_SECRET_KEY or '', ''),
+    )
+    payload = response.json()
+    if response.is_error:
+        raise StripeRequestError(payload.get('error', {}).get('message', f'Stripe returned {response.status_code}'))
+    return payload
@@ -1,15 +1,20 @@
+import json
+from datetime import date, timedelta
+
 import stripe
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
 from rest_framework.views import APIView
 from django.shortcuts import render, get_object_or_404
 from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.contrib.auth.models import User
-from .models import Service, Order, Profile, Product, Feedback, Transaction, ProductReview, SupportMessage
+from .models import Service, Order, Profile, Product, Feedback, Transaction, ProductReview, SupportMessage, CertificationUpload
 from .serializers import (
     UserRegistrationSerializer, 
     ServiceSerializer, 
@@ -20,10 +25,20 @@ from .serializers import (
     FeedbackSerializer,
     TransactionSerializer,
     ProductReviewSerializer,
-    SupportMessageSerializer
+    SupportMessageSerializer,
+    CertificationUploadSerializer,
+    NearbyProviderSerializer,
     )
 from rest_framework.response import Response
-from .utils import send_push_notification
+from .notifications import enqueue_push_notification
+from .availability import MAX_RANGE_DAYS, free_slots
+from .bookings import create_booking
+from .cache import CatalogCacheMixin, PRODUCTS, SERVICES
+from .geo import MAX_RADIUS_KM, nearby_providers
+from .pagination import CreatedAtCursorPagination
+from .payments import record_stripe_event
+from .search import search_queryset
+from .uploads import append_chunk
 from .serializers import ProfileSerializer
 
 class UserProfileView(APIView):
@@ -44,21 +59,21 @@ class UserProfileView(APIView):
 class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
 
-class ServiceListView(generics.ListAPIView):
-    queryset = Service.objects.all()
+class ServiceListView(CatalogCacheMixin, generics.ListAPIView):
+    queryset = Service.objects.select_related('rating_summary')
     serializer_class = ServiceSerializer
     permission_classes = [AllowAny]
+    cache_namespace = SERVICES
 
 class CreateOrderView(generics.CreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        order = serializer.save(user=self.request.user)
-        serializer.save(user=self.request.user)
+        order = create_booking(serializer, self.request.user)
         profile = self.request.user.profile
         if profile.expo_push_token:
-            send_push_notification(
+            enqueue_push_notification(
                 token=profile.expo_push_token,
                 title="Booking Confirmed!",
                 message=f"Your booking for {order.service.name} at {order.appointment_time.strftime('%I:%M %p, %d %b')} has been confirmed!"
@@ -67,6 +82,7 @@ class CreateOrderView(generics.CreateAPIView):
 class UserOrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user).order_by('-created_at')
@@ -83,13 +99,15 @@ class SaveExpoPushTokenView(generics.UpdateAPIView):
         profile.save()
         return Response({"message": "Push token saved successfully."}, status=status.HTTP_200_OK)
 
-class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.all().order_by('-created_at')
+class ProductListView(CatalogCacheMixin, generics.ListAPIView):
+    queryset = Product.objects.select_related('category', 'rating_summary').order_by('-created_at')
     serializer_class = ProductSerializer
     permission_classes = [AllowAny] 
+    cache_namespace = PRODUCTS
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        queryset = Product.objects.all().order_by('-created_at')
+        queryset = Product.objects.select_related('category', 'rating_summary').order_by('-created_at')
         category_id = self.request.query_params.get('category')
         if category_id:
             queryset = queryset.filter(category_id=category_id)
@@ -117,6 +135,7 @@ class CreatePaymentIntentView(APIView):
             return Response({"error": "Amount is required."}, status=400)
 
         stripe.api_key = settings.STRIPE_SECRET_KEY
+        stripe.api_base = settings.STRIPE_API_BASE
 
         try:
             # 1. Create payment intent with Stripe
@@ -148,6 +167,7 @@ class CreatePaymentIntentView(APIView):
 class TransactionListView(generics.ListAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return Transaction.objects.filter(user=self.request.user).order_by('-created_at')
@@ -156,6 +176,7 @@ class TransactionListView(generics.ListAPIView):
 @method_decorator(csrf_exempt, name='dispatch')
 class StripeWebhookView(APIView):
     permission_classes = []  # Public
+    authentication_classes = []  # Verified by the Stripe signature instead
 
     def post(self, request):
         payload = request.body
@@ -171,25 +192,11 @@ class StripeWebhookView(APIView):
         except stripe.error.SignatureVerificationError as e:
             return HttpResponse(status=400)
 
-        # 🔁 Handle the event
-        if event['type'] == 'payment_intent.succeeded':
-            intent = event['data']['object']
-            self._update_transaction(intent['id'], 'success')
-
-        elif event['type'] == 'payment_intent.payment_failed':
-            intent = event['data']['object']
-            self._update_transaction(intent['id'], 'failed')
+        # 🔁 Record the event; process_stripe_events applies it to the transaction
+        record_stripe_event(event['id'], event['type'], json.loads(payload))
 
         return HttpResponse(status=200)
 
-    def _update_transaction(self, payment_intent_id, status):
-        try:
-            txn = Transaction.objects.get(reference=payment_intent_id)
-            txn.status = status
-            txn.save()
-        except Transaction.DoesNotExist:
-            pass  
-
 class CreateProductReviewView(generics.CreateAPIView):
     serializer_class = ProductReviewSerializer
     permission_classes = [IsAuthenticated]
@@ -200,9 +207,24 @@ class CreateProductReviewView(generics.CreateAPIView):
 class SupportMessageListCreateView(generics.ListCreateAPIView):
     serializer_class = SupportMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    cursor_ordering = 'created_at'
 
     def get_queryset(self):
-        return SupportMessage.objects.filter(user=self.request.user).order_by('created_at')
+        queryset = SupportMessage.objects.filter(user=self.request.user).select_related('user').order_by('created_at')
+        # Incremental polling: only messages newer than what the client already has
+        since_id = self.request.query_params.get('since_id')
+        since = self.request.query_params.get('since')
+        if since_id:
+            if not (since_id.isascii() and since_id.isdigit()):
+                raise serializers.ValidationError({'since_id': 'Must be a message id.'})
+            queryset = queryset.filter(id__gt=since_id)
+        if since:
+            since_time = parse_datetime(since)
+            if since_time is None:
+                raise serializers.ValidationError({'since': 'Must be an ISO 8601 timestamp.'})
+            queryset = queryset.filter(created_at__gt=since_time)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -218,4 +240,116 @@ class AdminSupportMessageView(generics.CreateAPIView):
         serializer.save(
             user=target_user,
             is_from_admin=True
-        )
\ No newline at end of file
+        )
+
+
+class CertificationUploadCreateView(generics.CreateAPIView):
+    serializer_class = CertificationUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class CertificationUploadView(APIView):
+    """GET reports the acknowledged offset; PATCH appends a raw chunk at ``Upload-Offset``."""
+    permission_classes = [IsAuthenticated]
+
+    def get_upload(self, request, pk):
+        return get_object_or_404(CertificationUpload, pk=pk, user=request.user)
+
+    def respond(self, upload):
+        response = Response(CertificationUploadSerializer(upload).data)
+        response['Upload-Offset'] = upload.offset
+        return response
+
+    def get(self, request, pk):
+        return self.respond(self.get_upload(request, pk))
+
+    def patch(self, request, pk):
+        upload = self.get_upload(request, pk)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            raise serializers.ValidationError("Upload-Offset and Content-Length headers are required.")
+        # Read the raw body from the request stream instead of request.data,
+        # so the chunk is never parsed or held in memory.
+        upload = append_chunk(upload, offset, request.stream, length)
+        return self.respond(upload)
+
+class NearbyProviderListView(APIView):
+    """Approved providers within ``radius_km`` of ``lat``/``lng`` (default: the caller's profile location)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        profile = request.user.profile
+        try:
+            lat = float(params['lat']) if 'lat' in params else profile.latitude
+            lng = float(params['lng']) if 'lng' in params else profile.longitude
+            radius_km = float(params.get('radius_km', 10))
+            limit = int(params.get('limit', settings.API_PAGE_SIZE))
+        except ValueError:
+            raise serializers.ValidationError("lat, lng, radius_km and limit must be numbers.")
+        if lat is None or lng is None:
+            raise serializers.ValidationError("Pass lat and lng or set a location on your profile.")
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise serializers.ValidationError("lat/lng out of range.")
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise serializers.ValidationError(f"radius_km must be between 0 and {MAX_RADIUS_KM}.")
+        limit = max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+        providers = nearby_providers(lat, lng, radius_km, limit)
+        return Response(NearbyProviderSerializer(providers, many=True).data)
+
+class ServiceAvailabilityView(APIView):
+    """Open slots for a service from ``start`` to ``end`` (ISO dates, at most 31 days)."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        service = get_object_or_404(Service, pk=pk)
+        today = timezone.localdate()
+        try:
+            start = date.fromisoformat(request.query_params['start']) if 'start' in request.query_params else today
+            end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else start + timedelta(days=6)
+        except ValueError:
+            raise serializers.ValidationError("start and end must be YYYY-MM-DD dates.")
+        if end < start or (end - start).days >= MAX_RANGE_DAYS:
+            raise serializers.ValidationError(f"end must be on or after start and within {MAX_RANGE_DAYS} days.")
+
+        days = free_slots(service, max(start, today), end) if end >= today else {}
+        return Response({
+            'service': service.pk,
+            'duration_minutes': service.duration_minutes,
+            'days': [
+                {'date': day, 'slots': [slot.isoformat() for slot in slots]}
+                for day, slots in days.items()
+            ],
+        })
+
+
+class CatalogSearchView(APIView):
+    """Ranked product and service search: ``?q=<terms>&type=products|services&limit=20``."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        term = request.query_params.get('q', '')
+        kind = request.query_params.get('type')
+        if not term.strip():
+            raise serializers.ValidationError({'q': 'This parameter is required.'})
+        if kind not in (None, 'products', 'services'):
+            raise serializers.ValidationError({'type': 'Must be "products" or "services".'})
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), settings.API_MAX_PAGE_SIZE))
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'Must be a number.'})
+
+        results = {}
+        context = {'request': request}
+        if kind in (None, 'products'):
+            products = search_queryset(Product.objects.select_related('category', 'rating_summary'), term)[:limit]
+            results['products'] = ProductSerializer(products, many=True, context=context).data
+        if kind in (None, 'services'):
+            services = search_queryset(Service.objects.select_related('rating_summary'), term)[:limit]
+            results['services'] = ServiceSerializer(services, many=True, context=context).data
+        return Response(results)